@@ -1,9 +1,21 @@
 import React, { useState } from 'react';
 import { useNavigate } from 'react-router-dom'; // Import useNavigate
 import { motion, AnimatePresence } from 'framer-motion';
-import { createGraphFromPDF } from '../services/api';
+import { createGraphFromPDF, getJob } from '../services/api';
 import { UploadCloud, FileText, AlertCircle, CheckCircle, Loader } from 'lucide-react';
 
+const JOB_POLL_INTERVAL_MS = 2000;
+
+// Poll the graph job until the backend reports it done (returns the job) or failed (throws)
+const waitForJob = async (jobId) => {
+  for (;;) {
+    const { data: job } = await getJob(jobId);
+    if (job.status === 'done') return job;
+    if (job.status === 'failed') throw new Error(job.error || 'Graph creation failed.');
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+};
+
 const FileUpload = () => {
   const [selectedFile, setSelectedFile] = useState(null);
   const [status, setStatus] = useState('idle'); // idle, uploading, success, error
@@ -37,21 +49,16 @@ const FileUpload = () => {
 
     try {
       const response = await createGraphFromPDF(selectedFile, subtopicLimit); // Pass subtopic limit
+      setMessage(response.data.message || 'Processing PDF...');
+      const job = await waitForJob(response.data.job_id);
       setStatus('success');
-      setMessage(response.data.message || 'Graph created successfully!');
+      setMessage('Graph created successfully!');
       setSelectedFile(null);
 
-      const topics = response.data.topics || [];
-      if (topics.length > 0) {
-        const firstTopicId = topics[0].id;
-        setTimeout(() => {
-          navigate('/topics', { state: { selectedTopicId: firstTopicId } });
-        }, 1000);
-      } else {
-        setTimeout(() => {
-          navigate('/topics');
-        }, 1000);
-      }
+      // Open the topic this upload built, not whichever topic happens to sort first
+      setTimeout(() => {
+        navigate('/topics', { state: { selectedTopicId: job.topic_id } });
+      }, 1000);
     } catch (error) {
       setStatus('error');
       setMessage(error.response?.data?.detail || error.message || 'An error occurred during upload.');
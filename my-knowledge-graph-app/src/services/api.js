@@ -25,6 +25,11 @@ export const createGraphFromPDF = (file, limit = 10) => {
   });
 };
 
+// Graph creation runs as a background job; poll its status until it is done or failed
+export const getJob = (jobId) => {
+  return apiClient.get(`/jobs/${jobId}`);
+};
+
 // --- Topic Endpoints ---
 export const getAllTopics = () => {
   return apiClient.get('/topics');
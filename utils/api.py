@@ -1,4 +1,6 @@
+import asyncio
 import shutil
+import time
 import uuid
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -6,13 +8,13 @@ import os
 
 from pydantic import BaseModel, Field
 from pdf_extraactor import PDFKnowledgeGraph
-from fastapi import FastAPI, File, Form, Query, UploadFile, HTTPException
+from fastapi import BackgroundTasks, FastAPI, File, Form, Query, UploadFile, HTTPException
 import uvicorn
 from typing import List, Dict, Optional, Any
 from fastapi.responses import StreamingResponse
 from celerbud import BAMLFunctions  # Assuming BAMLFunctions is your Celerbud class
 from kuzu_init import KuzuDBManager  # Assuming KuzuDBManager is your database manager class
-from multimodal_db import MultimodalDB  # Assuming MultimodalDB is your LanceDB manager class
+from multimodal_db import MultimodalDB, new_pk  # Assuming MultimodalDB is your LanceDB manager class
 import logging
 logger= logging.getLogger("uvicorn.error")
 app = FastAPI()
@@ -31,16 +33,63 @@ app.add_middleware(
 # Shared KuzuDBManager instance for all operations
 shared_db_manager = KuzuDBManager(db_path="./kuzu_db", in_memory=False)
 print(f"Initialized shared KuzuDBManager with db_path: {shared_db_manager.db_path}")
+
+# Graph-build jobs by id: status is "queued", "running", "done" or "failed"
+graph_jobs: Dict[str, Dict[str, Any]] = {}
+GRAPH_JOB_TTL_SECONDS = 3600  # Finished jobs stay pollable this long
+MAX_FINISHED_GRAPH_JOBS = 256  # and at most this many are kept
+GRAPH_JOB_MAX_AGE_SECONDS = 6 * 3600  # Queued/running jobs older than this are given up on
+
+def prune_graph_jobs() -> None:
+    """Fail queued/running jobs past the age cap, then evict finished jobs older than the TTL and the oldest beyond the cap."""
+    now = time.time()
+    for job in list(graph_jobs.values()):
+        if job.get("finished_at") is None and now - job["created_at"] > GRAPH_JOB_MAX_AGE_SECONDS:
+            # A hung job is reported as failed and then ages out like any finished job
+            job["status"] = "failed"
+            job["error"] = f"Timed out after {GRAPH_JOB_MAX_AGE_SECONDS} seconds"
+            job["finished_at"] = now
+    finished = sorted(
+        (job["finished_at"], job_id) for job_id, job in list(graph_jobs.items()) if job.get("finished_at") is not None
+    )
+    for index, (finished_at, job_id) in enumerate(finished):
+        if now - finished_at > GRAPH_JOB_TTL_SECONDS or index < len(finished) - MAX_FINISHED_GRAPH_JOBS:
+            graph_jobs.pop(job_id, None)
+
+def run_graph_job(job_id: str, kg: PDFKnowledgeGraph, limit: int) -> None:
+    """Build the knowledge graph for a queued job and record the outcome in graph_jobs.
+
+    A sync function, so FastAPI runs it in its thread pool and the event loop stays free.
+    """
+    job = graph_jobs.get(job_id)
+    if job is None or job["status"] != "queued":
+        return  # Given up on (timed out or evicted) before it started
+    job["status"] = "running"
+    try:
+        # Raises if nothing was stored, so "done" always means this job's topic exists
+        job["topic_id"] = asyncio.run(kg.build_knowledge_graph(max_subtopics=limit))  # Subtopic number limited for testing
+        job["status"] = "done"
+    except Exception as e:
+        logger.exception(f"Graph job {job_id} failed: {e}")
+        job["error"] = str(e)
+        job["status"] = "failed"
+    finally:
+        if job["finished_at"] is None:  # Keep the time it was failed at if it was given up on while running
+            job["finished_at"] = time.time()
+
 @app.post("/create_graph")
-async def create_graph(file: UploadFile = File(...), limit: int = 10):
-    """Create a knowledge graph from an uploaded PDF file.
+async def create_graph(background_tasks: BackgroundTasks, file: UploadFile = File(...), limit: int = 10):
+    """Queue knowledge graph creation for an uploaded PDF file.
+
+    The PDF is saved and the build runs as a background task; poll GET /jobs/{job_id}
+    for its status and, once done, the id of the topic it built.
 
     Args:
         file (UploadFile): The PDF file to process.
         limit (int): Maximum number of subtopics to extract (default: 10).
 
     Returns:
-        dict: Success message and list of topics created.
+        dict: The job id and its initial status.
     """
     uploads_dir = "uploads"
     if not os.path.exists(uploads_dir):
@@ -55,16 +104,36 @@ async def create_graph(file: UploadFile = File(...), limit: int = 10):
         os.makedirs(output_dir)
     
     kg = PDFKnowledgeGraph(pdf_path=pdf_path, output_dir=output_dir, db_manager=shared_db_manager)
-    await kg.build_knowledge_graph(max_subtopics=limit)  # Subtopic number limited for testing
-    
-    # Store metadata for each topic created
-    topics = kg.get_all_topics()
-    
-    return {"message": "Graph created successfully", "topics": topics}
+    prune_graph_jobs()
+    job_id = uuid.uuid4().hex
+    graph_jobs[job_id] = {"job_id": job_id, "file": file.filename, "status": "queued", "topic_id": None, "error": None,
+                         "created_at": time.time(), "finished_at": None}
+    background_tasks.add_task(run_graph_job, job_id, kg, limit)
 
-    # Test with curl:
+    return {"message": "Graph creation started", "job_id": job_id, "status": "queued"}
+
+    # Test with curl (responds at once with {"message", "job_id", "status": "queued"}; poll /jobs/<job_id> for the topic_id):
     # curl -X POST "http://localhost:8008/create_graph?limit=5" -F "file=@/home/seq_amal/work_temp/Celervus_temp/Celervus_AI/Applied-Machine-Learning-and-AI-for-Engineers.pdf"
 
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Report the status of a graph creation job.
+
+    Args:
+        job_id (str): The id returned by /create_graph.
+
+    Returns:
+        dict: Job status, the built topic_id once done, or the error if it failed; 404 if unknown.
+    """
+    prune_graph_jobs()
+    job = graph_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+    # Test with curl (status is "queued", "running", "done" with topic_id, or "failed" with error):
+    # curl -X GET "http://localhost:8008/jobs/<job_id>"
+
 @app.get("/topics")
 def get_all_topics():
     """Retrieve all topics in the knowledge graph.
@@ -117,7 +186,7 @@ def get_subtopic_details(subtopic_id: str):
     # curl -X GET "http://localhost:8008/subtopics/s1"
 
 @app.get("/query")
-def query_endpoint(query: str):
+async def query_endpoint(query: str):
     """FastAPI endpoint to stream graph query results.
 
     Args:
@@ -128,7 +197,7 @@ def query_endpoint(query: str):
     """
     celerbud = BAMLFunctions(kuzu_client=shared_db_manager)
     return StreamingResponse(
-        celerbud.query_graph(query),  # Assuming query_graph_stream is defined in BAMLFunctions
+        celerbud.stream_query_graph(query),
         media_type="text/plain"
     )
 
@@ -136,6 +205,12 @@ def query_endpoint(query: str):
     # curl -N -X GET "http://localhost:8008/query?query=What%20subtopics%20are%20under%20the%20topic%20'Barcode%20Scanning%20Procedure:%20Align%20and%20Capture%20Barcode%20Data'?"
 # Shared DB instance
 shared_multimodal_db = MultimodalDB()
+
+@app.on_event("shutdown")
+def close_multimodal_db() -> None:
+    """Stop the image embedder's loader threads when the server shuts down."""
+    shared_multimodal_db.close()
+
 from fastapi.staticfiles import StaticFiles
 
 # ✅ Use absolute path for reliability
@@ -208,7 +283,7 @@ async def add_entry(
 
         # ✅ Prepare entry for DB
         entry = {
-            "pk": str(uuid.uuid4().hex),
+            "pk": new_pk(),
             "text": text,
             "file_path": save_path,
             "image_path": saved_image_url
@@ -1,19 +1,39 @@
 import asyncio
-from typing import List, Optional
+import hashlib
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from baml_client import b
+from baml_client.async_client import b as async_b
 from baml_client.types import ChatMessage, ContextSource, ChatResponse, BulletPoints,GraphResult,GraphSchema
 import os
 from dotenv import load_dotenv
 from kuzu_init import KuzuDBManager
-import re
 # Load API keys from .env if available
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+# Generated Cypher keyed by (normalized question, schema hash). Module-level because
+# api.py builds a new BAMLFunctions per request; oldest entries are evicted first.
+CYPHER_CACHE_SIZE = 256
+_cypher_cache: Dict[Tuple[str, str], str] = {}
+
+def _cypher_cache_key(query: str, schema: GraphSchema) -> Tuple[str, str]:
+    """Builds the Cypher cache key from the normalized question and a hash of the schema."""
+    schema_hash = hashlib.sha256(schema.model_dump_json().encode("utf-8")).hexdigest()
+    return (query.strip().lower(), schema_hash)
+
+def _remember_cypher(cache_key: Tuple[str, str], cypher_query: str) -> None:
+    """Stores a Cypher query that executed successfully, evicting the oldest entry when full."""
+    if cache_key in _cypher_cache:
+        return
+    if len(_cypher_cache) >= CYPHER_CACHE_SIZE:
+        _cypher_cache.pop(next(iter(_cypher_cache)))
+    _cypher_cache[cache_key] = cypher_query
+
 class BAMLFunctions:
     def __init__(self,kuzu_client: KuzuDBManager):
         self.client = b                    
+        self.async_client = async_b
         self.kuzu_client= kuzu_client
     def streaming_chat(self, messages: List[ChatMessage]) -> ChatResponse:
         """Fetches the best context for the query and executes a streaming chat function."""
@@ -24,6 +44,10 @@ class BAMLFunctions:
     def extract_bullet_points(self, text: str) -> BulletPoints:
         """Extracts bullet points from a given text."""
         return self.client.ExtractBulletPoints(text=text)
+
+    async def extract_bullet_points_async(self, text: str) -> BulletPoints:
+        """Extracts bullet points from a given text with the async client, so many calls can run concurrently."""
+        return await self.async_client.ExtractBulletPoints(text=text)
     def generate_response(self, messages: List[ChatMessage]) -> ChatResponse:
         """Generates a response based on the provided messages."""  
         user_message = next((msg for msg in messages if msg.role == "user"), None)
@@ -39,6 +63,10 @@ class BAMLFunctions:
         """Generates a subtopic name using BAML."""
         return self.client.GenerateSubtopicName(subtopic_text=subtopic_text)
 
+    async def generate_subtopic_name_async(self, subtopic_text: str) -> str:
+        """Generates a subtopic name with the async client, so many calls can run concurrently."""
+        return await self.async_client.GenerateSubtopicName(subtopic_text=subtopic_text)
+
     def check_subtopic_relevance(self, text: str) -> float:
         """Checks subtopic relevance using BAML."""
         return self.client.CheckSubtopicRelevance(text=text)
@@ -86,7 +114,27 @@ class BAMLFunctions:
         
         return sorted_context[:2]  # Return top 2 most relevant context sources
     def query_graph(self, query: str) -> str:
-            """Queries a graph database using BAML and streams the natural language response.
+            """Queries a graph database using BAML and returns the natural language response.
+
+            Synchronous wrapper around query_graph_async for callers without an event loop.
+
+            Args:
+                query (str): The natural language question to query the graph database.
+
+            Returns:
+                str: The final natural language answer based on the query results.
+
+            Raises:
+                RuntimeError: If called while an event loop is running; await query_graph_async instead.
+            """
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return asyncio.run(self.query_graph_async(query))
+            raise RuntimeError("query_graph cannot run inside an event loop; await query_graph_async instead.")
+
+    async def query_graph_async(self, query: str) -> str:
+            """Queries a graph database using the async BAML client and returns the natural language response.
 
             Args:
                 query (str): The natural language question to query the graph database.
@@ -94,93 +142,99 @@ class BAMLFunctions:
             Returns:
                 str: The final natural language answer based on the query results.
             """
+            return "".join([chunk async for chunk in self.stream_query_graph(query)])
+
+    async def stream_query_graph(self, query: str) -> AsyncIterator[str]:
+            """Queries a graph database and yields the natural language answer as it is generated.
+
+            The LLM calls are awaited and the KuzuDB calls run in a worker thread on that
+            thread's own connection, so the event loop can serve other requests meanwhile.
+
+            Args:
+                query (str): The natural language question to query the graph database.
+
+            Yields:
+                str: Successive pieces of the answer (or a single error message).
+            """
             try:
                 print(f"Starting query_graph with query: {query}")
 
-                # Step 1: Retrieve the schema from KuzuDB
+                # Step 1: Retrieve the structured schema from KuzuDB
                 print("Retrieving schema from KuzuDB...")
-                schema_str = self.kuzu_client.get_schema()
-                print(f"Schema retrieved as string:\n{schema_str}")
-
-                # Parse the structured string back into GraphSchema
-                nodes = []
-                relationships = []
-                properties = []
-                
-                # Extract nodes
-                node_section = re.search(r"Nodes:\n(.*?)(?:\nRelationships:|$)", schema_str, re.DOTALL)
-                if node_section and "None" not in node_section.group(1):
-                    for line in node_section.group(1).splitlines():
-                        if line.strip().startswith("- "):
-                            nodes.append(line.strip()[2:])  # Remove "  - "
-
-                # Extract relationships
-                rel_section = re.search(r"Relationships:\n(.*?)(?:\nProperties:|$)", schema_str, re.DOTALL)
-                if rel_section and "None" not in rel_section.group(1):
-                    for line in rel_section.group(1).splitlines():
-                        if line.strip().startswith("- "):
-                            relationships.append(line.strip()[2:])
-
-                # Extract properties
-                prop_section = re.search(r"Properties:\n(.*)", schema_str, re.DOTALL)
-                if prop_section and "None" not in prop_section.group():
-                    for line in prop_section.group(1).splitlines():
-                        if line.strip().startswith("- "):
-                            properties.append(line.strip()[2:])
-
-                schema = GraphSchema(nodes=nodes, relationships=relationships, properties=properties)
-                print(f"Parsed schema: Nodes - {schema.nodes}, Relationships - {schema.relationships}, Properties - {schema.properties}")
+                schema = await asyncio.to_thread(self.kuzu_client.get_graph_schema)
+                print(f"Retrieved schema: Nodes - {schema.nodes}, Relationships - {schema.relationships}, Properties - {schema.properties}")
                 
                 if not schema.nodes and not schema.relationships:
-                    return "Error: No schema found in the database."
-
-                # Step 2: Generate an OpenCypher query using BAML
-                print("Generating OpenCypher query using BAML...")
-                graph_query = self.client.GenerateGraphQuery(question=query, schema=schema)
-                cypher_query = graph_query.query
-                print(f"Generated Cypher query: {cypher_query}")
-                if not cypher_query:
-                    return "Error: Failed to generate a valid Cypher query."
+                    yield "Error: No schema found in the database."
+                    return
+
+                # Step 2: Generate an OpenCypher query using BAML, unless this question was
+                # already answered against the same schema
+                cache_key = _cypher_cache_key(query, schema)
+                cypher_query = _cypher_cache.get(cache_key)
+                if cypher_query:
+                    print(f"Using cached Cypher query: {cypher_query}")
+                else:
+                    print("Generating OpenCypher query using BAML...")
+                    graph_query = await self.async_client.GenerateGraphQuery(question=query, schema=schema)
+                    cypher_query = graph_query.query
+                    print(f"Generated Cypher query: {cypher_query}")
+                    if not cypher_query:
+                        yield "Error: Failed to generate a valid Cypher query."
+                        return
 
                 # Step 3: Execute the query against KuzuDB
                 print("Executing Cypher query against KuzuDB...")
-                response = self.kuzu_client.conn.execute(cypher_query)
-                result_data = []
-                while response.has_next():
-                    result_data.append(response.get_next())
+                result_data = await asyncio.to_thread(
+                    lambda: self.kuzu_client.execute(cypher_query).get_all()
+                )
                 print(f"Query execution results: {result_data}")
 
+                # Only remember queries that executed successfully
+                _remember_cypher(cache_key, cypher_query)
+
                 # Convert result to a string representation
-                result_str = "\n".join([str(row) for row in result_data]) if result_data else "No results found."
+                result_str = "\n".join(map(str, result_data)) if result_data else "No results found."
                 print(f"Formatted query results: {result_str}")
                 graph_result = GraphResult(result=result_str)
 
                 # Step 4: Analyze the results using BAML with streaming
                 print("Analyzing results using BAML with streaming...")
-                stream = self.client.stream.AnalyzeResults(
+                stream = self.async_client.stream.AnalyzeResults(
                     question=query,
                     query=cypher_query,
                     results=graph_result
                 )
 
-                # Process stream as it comes in
-                for partial in stream:# type: ignore
-                    if partial.answer:
-                        print(f"Current answer: {partial.answer.value}")
-                        print(f"Stream state: {partial.answer.state}")
-                    if partial.queryUsed:  # Only appears when complete due to @stream.done
-                        print(f"Query: {partial.queryUsed}")
-                    if partial.rawResults:  # Only appears when complete due to @stream.done
-                        print(f"Results: {partial.rawResults}")
+                # Each partial carries the whole answer so far; pass on only the new text.
+                # Text already sent cannot be taken back, so once a partial revises it the
+                # remaining partials are skipped and the final answer is sent in full below.
+                sent = ""
+                revised = False
+                async for partial in stream:# type: ignore
+                    answer = partial.answer.value if partial.answer else None
+                    if revised or not answer or len(answer) <= len(sent):
+                        continue
+                    if answer.startswith(sent):
+                        yield answer[len(sent):]
+                        sent = answer
+                    else:
+                        revised = True
 
                 # Step 5: Get final validated response after stream completes
-                final = stream.get_final_response() # type: ignore
+                final = await stream.get_final_response() # type: ignore
                 print(f"Final natural language response: {final.answer}")
-                return final.answer
+                if final.answer.startswith(sent):
+                    if len(final.answer) > len(sent):
+                        yield final.answer[len(sent):]
+                elif sent:
+                    yield f"\n\n{final.answer}" # The streamed text was revised; repeat the validated answer in full
+                else:
+                    yield final.answer
 
             except Exception as e:
                 print(f"Error querying graph: {e}")
-                return f"Error: Unable to process query '{query}' due to {str(e)}"
+                yield f"Error: Unable to process query '{query}' due to {str(e)}"
 if __name__ == "__main__":
     celerbud = BAMLFunctions()  # Assuming proper initialization
     query = "What subtopics are under the topic 'Barcode Scanning Procedure: Align and Capture Barcode Data'?"
@@ -9,6 +9,7 @@ Run: python3 diagnose_and_fix_lancedb.py
 """
 
 import os
+import re
 import sys
 import json
 import traceback
@@ -30,6 +31,9 @@ DB_PATH = "./lancedb"
 TABLE_NAME = "multimodal_table"
 ENTRIES_JSON = "entries.json"
 SANITIZED_JSON = "sanitized_entries.json"
+# patterns fixed_size_list<item: float>[NNN] in the table schema repr
+TEXT_DIM_RE = re.compile(r"text_vector:[^\n]*?fixed_size_list[^\n]*?\[(\d+)\]")
+IMAGE_DIM_RE = re.compile(r"image_vector:[^\n]*?fixed_size_list[^\n]*?\[(\d+)\]")
 
 def print_versions():
     try:
@@ -60,12 +64,10 @@ def get_table_schema():
     expected_image_dim = None
     try:
         s = schema_repr
-        # parse patterns fixed_size_list<item: float>[NNN]
-        import re
-        m_text = re.search(r"text_vector:.*?fixed_size_list.*?\[(\d+)\]", s)
+        m_text = TEXT_DIM_RE.search(s)
         if m_text:
             expected_text_dim = int(m_text.group(1))
-        m_image = re.search(r"image_vector:.*?fixed_size_list.*?\[(\d+)\]", s)
+        m_image = IMAGE_DIM_RE.search(s)
         if m_image:
             expected_image_dim = int(m_image.group(1))
     except Exception:
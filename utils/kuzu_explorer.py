@@ -1,8 +1,20 @@
 import cmd
+import os
+import shlex
+import sys
 import kuzu
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator
 from kuzu_init import KuzuDBManager  # Adjust import based on your file structure
 
+# Node labels defined by KuzuDBManager's schema; only these are interpolated into queries
+NODE_LABELS = ("Topic", "Subtopic")
+
+# Node listings are written in blocks of this many lines, so output stays streamed but not per-row
+OUTPUT_CHUNK_LINES = 1000
+
+# Managers opened in this process, keyed by database path, so reconnecting reuses them
+_MANAGER_POOL: Dict[str, KuzuDBManager] = {}
+
 class KuzuDBExplorer(cmd.Cmd):
     """A CLI tool to explore a KuzuDB database."""
     intro = "Welcome to the KuzuDB Explorer. Type 'help' or '?' for commands.\nSpecify the database path with 'connect <path>'."
@@ -18,7 +30,11 @@ class KuzuDBExplorer(cmd.Cmd):
             print("Error: Please provide a database path (e.g., './kuzu_db')")
             return
         try:
-            self.db_manager = KuzuDBManager(db_path=arg, in_memory=False)
+            # Keyed by absolute path, so './kuzu_db' and 'kuzu_db' share one Database
+            db_path = os.path.abspath(arg)
+            if db_path not in _MANAGER_POOL:
+                _MANAGER_POOL[db_path] = KuzuDBManager(db_path=db_path, in_memory=False)
+            self.db_manager = _MANAGER_POOL[db_path]
             print(f"Connected to database at {arg}")
         except Exception as e:
             print(f"Error connecting to database: {e}")
@@ -32,38 +48,67 @@ class KuzuDBExplorer(cmd.Cmd):
         print(schema)
 
     def do_nodes(self, arg: str) -> None:
-        """List all nodes of a specified type. Usage: nodes <node_type>"""
+        """List the IDs and names of all nodes of a specified type. Usage: nodes <node_type>"""
+        self._list_nodes(arg, full=False)
+
+    def do_nodes_full(self, arg: str) -> None:
+        """List all nodes of a specified type with all their properties. Usage: nodes_full <node_type>"""
+        self._list_nodes(arg, full=True)
+
+    def _list_nodes(self, arg: str, full: bool) -> None:
+        """Print the nodes of a type, either as ID/name pairs or with full properties."""
         if not self._check_connection():
             return
         if not arg:
             print("Error: Please specify a node type (e.g., 'Topic', 'Subtopic')")
             return
+        if not self._check_label(arg):
+            return
         try:
-            response = self.db_manager.conn.execute(f"MATCH (n:{arg}) RETURN n;")
-            nodes = []
-            while response.has_next():
-                node_data = response.get_next()[0]  # Extract node properties
-                nodes.append(f"ID: {node_data['id']}, Properties: {dict(node_data)}")
-            if nodes:
-                print(f"Nodes of type '{arg}':")
-                for node in nodes:
-                    print(f"  - {node}")
-            else:
+            found = False
+            lines = []
+            for row in self._iter_nodes(arg, full):
+                if not found:
+                    lines.append(f"Nodes of type '{arg}':")
+                    found = True
+                if full:
+                    node_data = row[0]  # Node properties are already a dict
+                    lines.append(f"  - ID: {node_data['id']}, Properties: {node_data}")
+                else:
+                    node_id, node_name = row
+                    lines.append(f"  - ID: {node_id}, Name: {node_name}")
+                if len(lines) >= OUTPUT_CHUNK_LINES:
+                    self._write_lines(lines)
+                    lines = []
+            self._write_lines(lines)
+            if not found:
                 print(f"No nodes found of type '{arg}'")
         except Exception as e:
             print(f"Error retrieving nodes: {e}")
 
+    def _iter_nodes(self, node_type: str, full: bool = False) -> Iterator[list]:
+        """Yield result rows one at a time; only id and name are projected unless full is set."""
+        projection = "n" if full else "n.id, n.name"
+        response = self.db_manager.execute_prepared(f"MATCH (n:{node_type}) RETURN {projection};")
+        while response.has_next():
+            yield response.get_next()
+
     def do_node(self, arg: str) -> None:
         """Display details of a specific node by ID. Usage: node <node_type> <id>"""
         if not self._check_connection():
             return
-        args = arg.split()
+        try:
+            args = shlex.split(arg)  # Lets IDs containing spaces be quoted
+        except ValueError:  # Unbalanced quotes
+            args = []
         if len(args) != 2:
             print("Error: Usage: node <node_type> <id> (e.g., 'node Topic t1')")
             return
         node_type, node_id = args
+        if not self._check_label(node_type):
+            return
         try:
-            response = self.db_manager.conn.execute(
+            response = self.db_manager.execute_prepared(
                 f"MATCH (n:{node_type} {{id: $id}}) RETURN n;",
                 {"id": node_id}
             )
@@ -81,36 +126,31 @@ class KuzuDBExplorer(cmd.Cmd):
     def _show_relationships(self, node_type: str, node_id: str) -> None:
         """Display relationships (branches) from a specific node."""
         try:
-            # Outgoing relationships
-            out_response = self.db_manager.conn.execute(
-                f"MATCH (n:{node_type} {{id: $id}})-[r]->(m) RETURN type(r), m;",
+            # Outgoing and incoming relationships in one round trip, tagged by direction
+            response = self.db_manager.execute_prepared(
+                f"MATCH (n:{node_type} {{id: $id}})-[r]->(m) RETURN 'out' AS dir, type(r) AS rel_type, m "
+                "UNION ALL "
+                f"MATCH (n:{node_type} {{id: $id}})<-[r]-(m) RETURN 'in' AS dir, type(r) AS rel_type, m;",
                 {"id": node_id}
             )
             outgoing = []
-            while out_response.has_next():
-                rel_type, target = out_response.get_next()
-                outgoing.append(f"{rel_type} -> {target['id']} ({target.get('name', 'Unnamed')})")
-            
-            # Incoming relationships
-            in_response = self.db_manager.conn.execute(
-                f"MATCH (n:{node_type} {{id: $id}})<-[r]-(m) RETURN type(r), m;",
-                {"id": node_id}
-            )
             incoming = []
-            while in_response.has_next():
-                rel_type, source = in_response.get_next()
-                incoming.append(f"{rel_type} <- {source['id']} ({source.get('name', 'Unnamed')})")
+            while response.has_next():
+                direction, rel_type, other = response.get_next()
+                if direction == "out":
+                    outgoing.append(f"{rel_type} -> {other['id']} ({other.get('name', 'Unnamed')})")
+                else:
+                    incoming.append(f"{rel_type} <- {other['id']} ({other.get('name', 'Unnamed')})")
 
             if outgoing or incoming:
-                print("Relationships:")
+                lines = ["Relationships:"]
                 if outgoing:
-                    print("  Outgoing:")
-                    for rel in outgoing:
-                        print(f"    - {rel}")
+                    lines.append("  Outgoing:")
+                    lines.extend(f"    - {rel}" for rel in outgoing)
                 if incoming:
-                    print("  Incoming:")
-                    for rel in incoming:
-                        print(f"    - {rel}")
+                    lines.append("  Incoming:")
+                    lines.extend(f"    - {rel}" for rel in incoming)
+                self._write_lines(lines)
             else:
                 print("  No relationships found.")
         except Exception as e:
@@ -119,12 +159,27 @@ class KuzuDBExplorer(cmd.Cmd):
     def do_exit(self, arg: str) -> bool:
         """Exit the CLI."""
         if self.db_manager:
-            del self.db_manager.conn
-            del self.db_manager.db
+            for manager in _MANAGER_POOL.values():
+                manager.close()
+            _MANAGER_POOL.clear()
+            self.db_manager = None
             print("Disconnected from database.")
         print("Goodbye!")
         return True
 
+    @staticmethod
+    def _write_lines(lines: List[str]) -> None:
+        """Write a block of output lines with a single write call instead of one print per line."""
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
+
+    def _check_label(self, node_type: str) -> bool:
+        """Check that a node type is one of the known labels before it is used in a query."""
+        if node_type not in NODE_LABELS:
+            print(f"Error: Unknown node type '{node_type}'. Expected one of: {', '.join(NODE_LABELS)}")
+            return False
+        return True
+
     def _check_connection(self) -> bool:
         """Check if a database connection is established."""
         if self.db_manager is None:
@@ -1,6 +1,13 @@
+import io
 import kuzu
 import json
-from typing import Optional, List, Dict, Any
+import threading
+import weakref
+import itertools
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import cached_property
+from typing import Optional, List, Dict, Any, Tuple, Iterator
 from langchain_kuzu.graphs.kuzu_graph import KuzuGraph
 from langchain_kuzu.chains.graph_qa.kuzu import KuzuQAChain
 from langchain_groq import ChatGroq
@@ -8,14 +15,35 @@ from dotenv import load_dotenv
 import os
 from dataclasses import dataclass, field
 from baml_client.types import GraphSchema
-@dataclass
+try:
+    import pyarrow  # noqa: F401  (needed by QueryResult.get_as_arrow)
+    HAS_ARROW = True
+except ImportError:  # pyarrow is optional; fall back to per-row fetching
+    HAS_ARROW = False
+
+# Fields of the STRUCT stored for each image in Subtopic.image_metadata
+IMAGE_METADATA_FIELDS = ("image_path", "image_name", "page_number", "url")
+IMAGE_METADATA_TYPE = "STRUCT(image_path STRING, image_name STRING, page_number STRING, url STRING)[]"
+# Subtopic dataclass attributes and the Subtopic node columns they are stored in
+SUBTOPIC_COLUMNS = {
+    "id": "id",
+    "name": "name",
+    "full_text": "text",
+    "bullet_points": "bullet_points",
+    "image_metadata": "image_metadata",
+}
+SUBTOPIC_FIELDS = tuple(SUBTOPIC_COLUMNS)
+# Tables created by KuzuDBManager._initialize_schema
+SCHEMA_TABLES = {"Topic", "Subtopic", "SUBTOPIC_OF", "SUBTOPIC_OF_SUBTOPIC"}
+
+@dataclass(slots=True)
 class Topic:
     """Represents a main topic with content and metadata."""
     id: str
     name: str # Name of the topic (Main Topic of the entire pdf)
 
 
-@dataclass
+@dataclass(slots=True)
 class Subtopic:#Individual topics inside the pdf
     """Represents a subtopic linked to a main topic with content and metadata."""
     id: str
@@ -24,8 +52,31 @@ class Subtopic:#Individual topics inside the pdf
     bullet_points: List[str] = field(default_factory=list)
     image_metadata: List[Dict[str, str]] = field(default_factory=list)
 
+
+class _ConnectionLease:
+    """Per-thread token: when a thread's local state is dropped (the thread ended), its connection is closed."""
+    __slots__ = ("__weakref__",)
+
+
+def _release_connection(connections: Dict[int, "kuzu.Connection"], key: int, lock: threading.Lock) -> None:
+    """Close a thread's connection once, unless close() already took it."""
+    with lock:
+        conn = connections.pop(key, None)
+    if conn is not None:
+        conn.close()
+
+
+def _image_structs(image_metadata: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Normalize image metadata dicts to the exact string fields of the Subtopic image STRUCT."""
+    return [{key: str(img.get(key, "")) for key in IMAGE_METADATA_FIELDS} for img in image_metadata]
+
 class KuzuDBManager:
     """Manages a local Kuza database with topic/subtopic creation and querying."""
+
+    TOPIC_CACHE_SIZE = 1024
+    SUBTOPICS_CACHE_SIZE = 256
+    ARROW_CHUNK_SIZE = 2048
+    TABLE_SCHEMA_CACHE_SIZE = 128
     
     def __init__(self, db_path: str = "./kuzu_db", in_memory: bool = False):
         """
@@ -38,47 +89,358 @@ class KuzuDBManager:
         self.db_path = ":memory:" if in_memory else db_path
         self.db = kuzu.Database(self.db_path)
         self.conn = kuzu.Connection(self.db)
-        self.graph = KuzuGraph(self.db, allow_dangerous_requests=True)
-        self.llm = ChatGroq(temperature=0, api_key=os.getenv("GROQ_API"), model="llama-3.3-70b-versatile")#type: ignore[assignment]
-        self.qa_chain = KuzuQAChain.from_llm(llm=self.llm, graph=self.graph, verbose=True, allow_dangerous_requests=True)
+        # Cached catalog reads; cleared whenever DDL may have changed the catalog. They are read and
+        # filled under _read_cache_lock, and a fill is dropped if the catalog changed while it ran
+        self._tables_cache: Optional[List[list]] = None
+        self._graph_schema_cache: Optional[GraphSchema] = None
+        self._schema_text_cache: Optional[str] = None
+        self._table_schema_cache: "OrderedDict[Tuple[bool, str], str]" = OrderedDict()
+        self._table_descriptions: Dict[str, Tuple[str, List[str]]] = {}
+        self._tables_by_id: Dict[int, list] = {}
+        self._tables_by_name: Dict[str, list] = {}
+        # Per-thread connection, prepared statements (keyed by query text) and transaction flag.
+        # Kuzu supports many connections on one Database, but prepared statements and
+        # transactions belong to the connection that created them, so each thread keeps its own.
+        # Reads run concurrently on those connections; writes do not (see _write_lock).
+        self._local = threading.local()
+        self._owner_thread = threading.get_ident()
+        # Connections opened for other threads. Each is closed when its thread ends (see _ConnectionLease),
+        # so retired worker threads don't accumulate connections, and the rest by close()
+        self._thread_connections: Dict[int, kuzu.Connection] = {}
+        self._connection_keys = itertools.count()
+        self._catalog_version = 0
+        # LRU caches for topic/subtopic reads; entries are dropped by the write methods
+        self._topic_cache: "OrderedDict[str, Topic]" = OrderedDict()
+        self._subtopics_cache: "OrderedDict[str, List[Subtopic]]" = OrderedDict()
+        # Bumped on every invalidation and commit; a read only fills the cache if it didn't move
+        # while the query ran, so a snapshot taken before a commit is never cached after it
+        self._data_version = 0
+        self._read_cache_lock = threading.Lock()
+        # Kuzu allows one write transaction at a time and fails a second one instead of waiting,
+        # so writes are serialized here. Held for the whole of batch_writes() (reentrant, so the
+        # write methods called inside it don't block) and for every standalone write.
+        self._write_lock = threading.RLock()
         self._initialize_schema()
 
+    # The LangChain QA stack is only used by query_db, so it is built on first use
+    @cached_property
+    def graph(self) -> KuzuGraph:
+        return KuzuGraph(self.db, allow_dangerous_requests=True)
+
+    @cached_property
+    def llm(self) -> ChatGroq:
+        return ChatGroq(temperature=0, api_key=os.getenv("GROQ_API"), model="llama-3.3-70b-versatile")#type: ignore[arg-type]
+
+    @cached_property
+    def qa_chain(self) -> KuzuQAChain:
+        return KuzuQAChain.from_llm(llm=self.llm, graph=self.graph, verbose=True, allow_dangerous_requests=True)
+
+    def close(self) -> None:
+        """
+        Release the database: drop the lazily built QA stack (it holds its own connection),
+        close the per-thread connections and the owner connection, then close the database.
+        The manager must not be used afterwards.
+        """
+        for name in ("qa_chain", "llm", "graph"):
+            self.__dict__.pop(name, None)  # cached_property values live in the instance dict
+        with self._read_cache_lock:
+            connections = list(self._thread_connections.values())
+            self._thread_connections.clear()
+            self._topic_cache.clear()
+            self._subtopics_cache.clear()
+        self._local = threading.local()
+        for conn in connections:
+            conn.close()
+        self.conn.close()
+        self.db.close()
+
     def _initialize_schema(self) -> None:
-        """Initialize the database schema with Topic, Subtopic, and relationship tables."""
+        """
+        Initialize the database schema with Topic, Subtopic, and relationship tables (including nested subtopics).
+        The catalog is read once first, and DDL is only issued for tables that are missing.
+        """
         try:
-            self.conn.execute("""
-                CREATE NODE TABLE IF NOT EXISTS Topic(
-                    id STRING,
-                    name STRING,
-                    PRIMARY KEY (id)
-                );
-            """)
+            existing = {row[1] for row in self._get_tables()}
         except Exception as e:
-            print(f"Error creating Topic table: {e}")
+            print(f"Error reading existing tables, creating schema unconditionally: {e}")
+            existing = set()
+        if "Subtopic" in existing:
+            try:
+                self._migrate_image_metadata()
+            except Exception as e:
+                print(f"Error migrating Subtopic.image_metadata to {IMAGE_METADATA_TYPE}: {e}")
+        if SCHEMA_TABLES.issubset(existing):
+            return
 
-        try:
-            self.conn.execute("""
-                CREATE NODE TABLE IF NOT EXISTS Subtopic(
-                    id STRING,
-                    name STRING,
-                    text STRING,
-                    bullet_points STRING[],
-                    image_metadata STRING,
-                    PRIMARY KEY (id)
-                );
-            """)
-        except Exception as e:
-            print(f"Error creating Subtopic table: {e}")
+        if "Topic" not in existing:
+            try:
+                self.execute("""
+                    CREATE NODE TABLE IF NOT EXISTS Topic(
+                        id STRING,
+                        name STRING,
+                        PRIMARY KEY (id)
+                    );
+                """)
+            except Exception as e:
+                print(f"Error creating Topic table: {e}")
+
+        if "Subtopic" not in existing:
+            try:
+                self.execute(f"""
+                    CREATE NODE TABLE IF NOT EXISTS Subtopic(
+                        id STRING,
+                        name STRING,
+                        text STRING,
+                        bullet_points STRING[],
+                        image_metadata {IMAGE_METADATA_TYPE},
+                        PRIMARY KEY (id)
+                    );
+                """)
+            except Exception as e:
+                print(f"Error creating Subtopic table: {e}")
+
+        if "SUBTOPIC_OF" not in existing:
+            try:
+                self.execute("""
+                    CREATE REL TABLE IF NOT EXISTS SUBTOPIC_OF(
+                        FROM Subtopic TO Topic,
+                        position UINT32
+                    );
+                """)
+            except Exception as e:
+                print(f"Error creating SUBTOPIC_OF relationship table: {e}")
+
+        if "SUBTOPIC_OF_SUBTOPIC" not in existing:
+            try:
+                self.execute("""
+                    CREATE REL TABLE IF NOT EXISTS SUBTOPIC_OF_SUBTOPIC(
+                        FROM Subtopic TO Subtopic,
+                        position UINT32
+                    );
+                """)
+            except Exception as e:
+                print(f"Error creating SUBTOPIC_OF_SUBTOPIC relationship table: {e}")
+
+        self._invalidate_catalog_cache()
+
+    def _migrate_image_metadata(self) -> None:
+        """
+        One-shot migration for databases created when Subtopic.image_metadata was a JSON STRING:
+        decode every row into the STRUCT[] column and drop the old column. No-op once migrated.
+        Each step checks the current columns, so a run interrupted part-way resumes where it stopped
+        (image_metadata_json is only dropped after the backfill has committed).
+        """
+        columns = {row[1]: row[2] for row in self.execute("CALL TABLE_INFO('Subtopic') RETURN *;").get_all()}
+        if "image_metadata_json" not in columns and columns.get("image_metadata") != "STRING":
+            return
 
+        print(f"Migrating Subtopic.image_metadata from JSON STRING to {IMAGE_METADATA_TYPE}...")
         try:
-            self.conn.execute("""
-                CREATE REL TABLE IF NOT EXISTS SUBTOPIC_OF(
-                    FROM Subtopic TO Topic,
-                    position UINT32
-                );
-            """)
-        except Exception as e:
-            print(f"Error creating SUBTOPIC_OF relationship table: {e}")
+            if "image_metadata_json" not in columns:
+                self.execute("ALTER TABLE Subtopic RENAME image_metadata TO image_metadata_json;")
+                columns["image_metadata_json"] = columns.pop("image_metadata")
+            if "image_metadata" not in columns:
+                self.execute(f"ALTER TABLE Subtopic ADD image_metadata {IMAGE_METADATA_TYPE};")
+            rows = [
+                {"id": subtopic_id, "image_metadata": _image_structs(json.loads(raw) if raw else [])}
+                for subtopic_id, raw in self.execute(
+                    "MATCH (s:Subtopic) RETURN s.id, s.image_metadata_json;"
+                ).get_all()
+            ]
+            if rows:
+                # The backfill commits as a whole, so a failure leaves image_metadata_json to retry from
+                with self.batch_writes():
+                    self.execute(
+                        """
+                        UNWIND $rows AS row
+                        MATCH (s:Subtopic {id: row.id})
+                        SET s.image_metadata = row.image_metadata
+                        """,
+                        {"rows": rows}
+                    )
+            self.execute("ALTER TABLE Subtopic DROP image_metadata_json;")
+        finally:
+            self._invalidate_catalog_cache()
+        print(f"Migrated image_metadata for {len(rows)} subtopics.")
+
+    def _get_tables(self) -> List[list]:
+        """
+        Return the rows of CALL SHOW_TABLES(), cached until the catalog changes.
+
+        :return: List of [id, name, type, ...] rows as returned by Kuzu.
+        """
+        return self._get_table_index()[0]
+
+    def _get_table_index(self) -> Tuple[List[list], Dict[int, list], Dict[str, list]]:
+        """Return the SHOW_TABLES rows with their by-id and by-name lookups, as one consistent snapshot."""
+        with self._read_cache_lock:
+            if self._tables_cache is not None:
+                return self._tables_cache, self._tables_by_id, self._tables_by_name
+            version = self._catalog_version
+        tables = self.execute("CALL SHOW_TABLES() RETURN *;").get_all()
+        by_id = {row[0]: row for row in tables}
+        by_name = {row[1]: row for row in tables}
+        with self._read_cache_lock:
+            if version == self._catalog_version:
+                self._tables_cache, self._tables_by_id, self._tables_by_name = tables, by_id, by_name
+        return tables, by_id, by_name
+
+    def _invalidate_catalog_cache(self) -> None:
+        """Drop all cached catalog reads and (every thread's) prepared statements so they are rebuilt against the new catalog."""
+        with self._read_cache_lock:
+            self._tables_cache = None
+            self._graph_schema_cache = None
+            self._schema_text_cache = None
+            self._table_schema_cache = OrderedDict()
+            self._table_descriptions = {}
+            self._tables_by_id = {}
+            self._tables_by_name = {}
+            self._catalog_version += 1  # Makes every thread drop its prepared statements
+
+    def _thread_state(self) -> threading.local:
+        """
+        Return this thread's connection state. The creating thread reuses self.conn; any other
+        thread gets its own kuzu.Connection on first use, so concurrent callers don't share one.
+        That connection is closed when the thread ends and its thread-local state is released.
+        """
+        state = self._local
+        if not hasattr(state, "conn"):
+            if threading.get_ident() == self._owner_thread:
+                state.conn = self.conn
+            else:
+                state.conn = kuzu.Connection(self.db)
+                key = next(self._connection_keys)
+                with self._read_cache_lock:
+                    self._thread_connections[key] = state.conn
+                state.lease = _ConnectionLease()
+                weakref.finalize(state.lease, _release_connection, self._thread_connections, key, self._read_cache_lock)
+            state.prepared = {}
+            state.catalog_version = self._catalog_version
+            state.in_transaction = False
+        if state.catalog_version != self._catalog_version:
+            state.prepared = {}
+            state.catalog_version = self._catalog_version
+        return state
+
+    def execute_prepared(self, query: str, parameters: Optional[Dict[str, Any]] = None) -> kuzu.QueryResult:
+        """
+        Execute a Cypher query through a prepared statement that is compiled once per query text.
+
+        :param query: Cypher query; values should be passed as $parameters, not interpolated.
+        :param parameters: Parameter values for the query.
+        :return: The Kuzu QueryResult.
+        """
+        state = self._thread_state()
+        statement = state.prepared.get(query)
+        if statement is None:
+            statement = state.conn.prepare(query)
+            if not statement.is_success():
+                raise RuntimeError(statement.get_error_message())
+            state.prepared[query] = statement
+        return state.conn.execute(statement, parameters or {})
+
+    def execute(self, query: str, parameters: Optional[Dict[str, Any]] = None) -> kuzu.QueryResult:
+        """
+        Execute a one-off Cypher query (e.g. LLM-generated) on this thread's connection without
+        keeping a prepared statement for it.
+
+        :param query: Cypher query.
+        :param parameters: Parameter values for the query.
+        :return: The Kuzu QueryResult.
+        """
+        state = self._thread_state()
+        if parameters:
+            return state.conn.execute(query, parameters)
+        return state.conn.execute(query)
+
+    def _execute_write(self, query: str, parameters: Optional[Dict[str, Any]] = None) -> kuzu.QueryResult:
+        """Run a write through execute_prepared while holding the write lock."""
+        with self._write_lock:
+            return self.execute_prepared(query, parameters)
+
+    def _cache_get(self, cache: OrderedDict, key: Any) -> Any:
+        """Return a cached read (marking it most recently used) or None on a miss."""
+        with self._read_cache_lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _data_snapshot(self) -> int:
+        """Return the current data version, to pass to _cache_put for a read about to run."""
+        with self._read_cache_lock:
+            return self._data_version
+
+    def _cache_put(self, cache: OrderedDict, key: Any, value: Any, max_size: int,
+                   data_version: Optional[int] = None) -> None:
+        """
+        Store a read result, evicting the least recently used entry when full. With data_version,
+        the result is dropped if topic/subtopic data was written since that snapshot.
+        """
+        with self._read_cache_lock:
+            if data_version is not None and data_version != self._data_version:
+                return
+            cache[key] = value
+            cache.move_to_end(key)
+            if len(cache) > max_size:
+                cache.popitem(last=False)
+
+    def _invalidate_topic(self, topic_id: str) -> None:
+        """Drop the cached Topic for topic_id."""
+        with self._read_cache_lock:
+            self._topic_cache.pop(topic_id, None)
+            self._data_version += 1
+
+    def _invalidate_subtopics(self) -> None:
+        """
+        Drop all cached subtopic lists. A subtopic MERGE can update a node that is
+        linked to other topics too, so a single-key pop would leave stale lists behind.
+        """
+        with self._read_cache_lock:
+            self._subtopics_cache.clear()
+            self._data_version += 1
+
+    def _clear_read_caches(self) -> None:
+        """Drop every cached topic and subtopic list, e.g. once a transaction has committed or rolled back."""
+        with self._read_cache_lock:
+            self._topic_cache.clear()
+            self._subtopics_cache.clear()
+            self._data_version += 1
+
+    @contextmanager
+    def batch_writes(self) -> Iterator[None]:
+        """
+        Run the writes made inside the block in one explicit transaction, so they are
+        committed (and flushed) once instead of once per statement. Nested use joins
+        the outer transaction. Rolls back and re-raises if the block raises.
+        The write lock is held throughout, so a concurrent writer waits for the COMMIT
+        instead of failing to start its own write transaction.
+        """
+        state = self._thread_state()
+        if state.in_transaction:
+            yield
+            return
+        with self._write_lock:
+            state.conn.execute("BEGIN TRANSACTION;")
+            state.in_transaction = True
+            try:
+                yield
+                state.conn.execute("COMMIT;")
+                # The write methods invalidated the caches before COMMIT, while other threads'
+                # connections still saw the old snapshot and could re-cache it; clear again now
+                self._clear_read_caches()
+            except Exception:
+                try:
+                    state.conn.execute("ROLLBACK;")
+                except Exception as e:
+                    # Kuzu may already have aborted the transaction (e.g. COMMIT itself failed);
+                    # report it and keep the original error, which is re-raised below
+                    print(f"Error rolling back transaction: {e}")
+                # Reads made inside the transaction may have cached rows that no longer exist
+                self._clear_read_caches()
+                raise
+            finally:
+                state.in_transaction = False
 
     def create_topic(self, topic: Topic) -> bool:
         """
@@ -88,17 +450,17 @@ class KuzuDBManager:
         :return: True if successful, False otherwise.
         """
         try:
-            self.conn.execute(
+            self._execute_write(
                 """
                 MERGE (t:Topic {id: $id})
-                ON MATCH SET t.name = $name
-                ON CREATE SET t.name = $name
+                SET t.name = $name
                 """,
                 {
                     "id": topic.id,
                     "name": topic.name,
                 }
             )
+            self._invalidate_topic(topic.id)
             return True
         except Exception as e:
             print(f"Error creating topic {topic.id}: {e}")
@@ -113,33 +475,111 @@ class KuzuDBManager:
         :param position: Order of the subtopic within the topic (default 0).
         :return: True if successful, False otherwise.
         """
+        return self.create_and_link_subtopics_bulk(parent_topic_id, [subtopic], [position])
+
+    def create_and_link_subtopics_bulk(self, parent_topic_id: str, subtopics: List[Subtopic],
+                                       positions: Optional[List[int]] = None) -> bool:
+        """
+        Create many subtopics and link them to a parent topic with a single UNWIND query.
+
+        :param parent_topic_id: ID of the parent topic.
+        :param subtopics: Subtopic objects to create and link.
+        :param positions: Order of each subtopic within the topic (default: list order).
+        :return: True if successful, False otherwise.
+        """
+        if not subtopics:
+            return True
+        if positions is None:
+            positions = list(range(len(subtopics)))
         try:
-            image_metadata_json = json.dumps(subtopic.image_metadata)
-            self.conn.execute(
+            rows = [
+                {
+                    "id": s.id,
+                    "name": s.name,
+                    "text": s.full_text,
+                    "bullet_points": s.bullet_points,
+                    "image_metadata": _image_structs(s.image_metadata),
+                    "position": p
+                }
+                for s, p in zip(subtopics, positions)
+            ]
+            self._execute_write(
                 """
                 MATCH (t:Topic {id: $topic_id})
-                MERGE (s:Subtopic {id: $subtopic_id})
-                ON MATCH SET s.name = $name, s.text = $text, s.bullet_points = $bullet_points,
-                            s.image_metadata = $image_metadata
-                ON CREATE SET s.name = $name, s.text = $text, s.bullet_points = $bullet_points,
-                            s.image_metadata = $image_metadata
+                UNWIND $rows AS row
+                MERGE (s:Subtopic {id: row.id})
+                SET s.name = row.name, s.text = row.text, s.bullet_points = row.bullet_points,
+                    s.image_metadata = row.image_metadata
                 MERGE (s)-[r:SUBTOPIC_OF]->(t)
-                ON MATCH SET r.position = $position
-                ON CREATE SET r.position = $position
+                SET r.position = row.position
                 """,
                 {
                     "topic_id": parent_topic_id,
-                    "subtopic_id": subtopic.id,
-                    "name": subtopic.name,
-                    "text": subtopic.full_text,
-                    "bullet_points": subtopic.bullet_points,
-                    "image_metadata": image_metadata_json,
-                    "position": position
+                    "rows": rows
                 }
             )
+            self._invalidate_subtopics()
+            return True
+        except Exception as e:
+            print(f"Error creating and linking {len(subtopics)} subtopic(s) to topic {parent_topic_id}: {e}")
+            return False
+
+    def unlink_subtopics(self, parent_topic_id: str) -> Optional[List[str]]:
+        """
+        Delete every SUBTOPIC_OF edge into a topic, so it can be re-linked from scratch
+        (e.g. when the same PDF is re-ingested with a different subtopic list).
+
+        :param parent_topic_id: ID of the parent topic.
+        :return: IDs of the subtopics that were unlinked (pass them to delete_unlinked_subtopics
+                 once the topic is re-linked), or None on error.
+        """
+        try:
+            with self._write_lock:  # The IDs read must be the edges deleted
+                response = self.execute_prepared(
+                    "MATCH (t:Topic {id: $topic_id})<-[:SUBTOPIC_OF]-(s:Subtopic) RETURN s.id",
+                    {"topic_id": parent_topic_id}
+                )
+                subtopic_ids = [row[0] for row in response.get_all()]
+                if subtopic_ids:
+                    self._execute_write(
+                        """
+                        MATCH (t:Topic {id: $topic_id})<-[r:SUBTOPIC_OF]-(:Subtopic)
+                        DELETE r
+                        """,
+                        {"topic_id": parent_topic_id}
+                    )
+            self._invalidate_subtopics()
+            return subtopic_ids
+        except Exception as e:
+            print(f"Error unlinking subtopics from topic {parent_topic_id}: {e}")
+            return None
+
+    def delete_unlinked_subtopics(self, subtopic_ids: List[str]) -> bool:
+        """
+        DETACH DELETE those of the given subtopics that no longer have any parent (no SUBTOPIC_OF
+        or SUBTOPIC_OF_SUBTOPIC edge out of them), so replaced subtopics don't linger as unreachable
+        nodes that generated Cypher still matches.
+
+        :param subtopic_ids: Candidate subtopic IDs, e.g. as returned by unlink_subtopics.
+        :return: True if successful, False otherwise.
+        """
+        if not subtopic_ids:
+            return True
+        try:
+            self._execute_write(
+                """
+                MATCH (s:Subtopic)
+                WHERE s.id IN $ids
+                  AND NOT EXISTS { MATCH (s)-[:SUBTOPIC_OF]->(:Topic) }
+                  AND NOT EXISTS { MATCH (s)-[:SUBTOPIC_OF_SUBTOPIC]->(:Subtopic) }
+                DETACH DELETE s
+                """,
+                {"ids": subtopic_ids}
+            )
+            self._invalidate_subtopics()
             return True
         except Exception as e:
-            print(f"Error creating and linking subtopic {subtopic.id} to topic {parent_topic_id}: {e}")
+            print(f"Error deleting {len(subtopic_ids)} unlinked subtopic(s): {e}")
             return False
 
     def query_db(self, user_query: str) -> Dict[str, Any]:
@@ -158,57 +598,135 @@ class KuzuDBManager:
 
     def get_topic(self, topic_id: str) -> Optional[Topic]:
         """
-        Retrieve a topic by ID and return it as a Topic object.
+        Retrieve a topic by ID and return it as a Topic object (cached until the topic is rewritten).
 
         :param topic_id: ID of the topic to retrieve.
         :return: Topic object or None if not found.
         """
+        cached = self._cache_get(self._topic_cache, topic_id)
+        if cached is not None:
+            return cached
+        data_version = self._data_snapshot()
         try:
-            response = self.conn.execute(
+            response = self.execute_prepared(
                 "MATCH (t:Topic {id: $id}) RETURN t",
                 {"id": topic_id}
             )
             if response.has_next():
                 data = response.get_next()[0]  # Assuming 't' is a dict
-                return Topic(
+                topic = Topic(
                     id=data["id"],
                     name=data["name"]
                 )
+                self._cache_put(self._topic_cache, topic_id, topic, self.TOPIC_CACHE_SIZE, data_version)
+                return topic
             return None
         except Exception as e:
             print(f"Error retrieving topic {topic_id}: {e}")
             return None
 
-    def get_subtopics(self, topic_id: str) -> List[Subtopic]:
+    def get_subtopics(self, topic_id: str, fields: Tuple[str, ...] = SUBTOPIC_FIELDS) -> List[Subtopic]:
         """
-        Retrieve all subtopics of a topic as Subtopic objects.
+        Retrieve all subtopics of a topic as Subtopic objects (cached until a subtopic is written).
         
         :param topic_id: ID of the parent topic.
+        :param fields: Subtopic attributes to fetch (default: all); others are left empty.
         :return: List of Subtopic objects.
         """
+        full = tuple(fields) == SUBTOPIC_FIELDS
+        if full:
+            cached = self._cache_get(self._subtopics_cache, topic_id)
+            if cached is not None:
+                return list(cached)
+        data_version = self._data_snapshot()
         try:
-            response = self.conn.execute(
-                """
-                MATCH (s:Subtopic)-[r:SUBTOPIC_OF]->(t:Topic {id: $id})
-                RETURN s, r.position ORDER BY r.position
-                """,
-                {"id": topic_id}
-            )
-            subtopics = []
-            while response.has_next():
-                data = response.get_next()  # Returns (s, position)
-                subtopic_data, position = data  # Extracting node and position
-                subtopics.append(Subtopic(
-                    id=subtopic_data["id"],
-                    name=subtopic_data["name"],
-                    full_text=subtopic_data["text"],
-                    bullet_points=subtopic_data["bullet_points"],
-                    image_metadata=json.loads(subtopic_data["image_metadata"])
-                ))
-            return subtopics
+            subtopics = list(self.iter_subtopics(topic_id, fields))
+            if full and subtopics:  # An empty list may be a topic whose build hasn't committed yet
+                self._cache_put(self._subtopics_cache, topic_id, subtopics, self.SUBTOPICS_CACHE_SIZE, data_version)
+            return list(subtopics)
         except Exception as e:
             print(f"Error retrieving subtopics for topic {topic_id}: {e}")
             return []
+
+    def iter_subtopics(self, topic_id: str, fields: Tuple[str, ...] = SUBTOPIC_FIELDS) -> Iterator[Subtopic]:
+        """
+        Yield the subtopics of a topic in position order. Only the requested fields are projected
+        in Cypher, so e.g. ("id", "name") never transfers text or image metadata.
+
+        :param topic_id: ID of the parent topic.
+        :param fields: Subtopic attributes to fetch (default: all); others are left empty.
+        :return: Iterator of Subtopic objects; errors propagate to the caller.
+        """
+        from_row = self._subtopic_from_row
+        for columns in self._iter_subtopic_columns(topic_id, fields):
+            for row in zip(*columns):
+                yield from_row(fields, row)
+
+    def get_subtopics_columnar(self, topic_id: str, fields: Tuple[str, ...] = SUBTOPIC_FIELDS) -> Dict[str, list]:
+        """
+        Retrieve the subtopics of a topic as one list per field (in position order), without
+        building a Subtopic object per row. Useful for serializers that only need the columns.
+
+        :param topic_id: ID of the parent topic.
+        :param fields: Subtopic attributes to fetch (default: all).
+        :return: Dict mapping each field to its column of values; empty columns on error.
+        """
+        result: Dict[str, list] = {f: [] for f in fields}
+        try:
+            for columns in self._iter_subtopic_columns(topic_id, fields):
+                for f, column in zip(fields, columns):
+                    if f in ("bullet_points", "image_metadata"):
+                        column = [value or [] for value in column]
+                    result[f].extend(column)
+            return result
+        except Exception as e:
+            print(f"Error retrieving subtopic columns for topic {topic_id}: {e}")
+            return {f: [] for f in fields}
+
+    def _iter_subtopic_columns(self, topic_id: str, fields: Tuple[str, ...]) -> Iterator[List[list]]:
+        """
+        Yield the projected subtopic fields in batches, as one list per field. With pyarrow
+        installed each batch is an Arrow record batch (one driver call per batch); otherwise
+        rows are fetched one at a time and transposed every ARROW_CHUNK_SIZE rows.
+        """
+        unknown = [f for f in fields if f not in SUBTOPIC_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown Subtopic field(s): {', '.join(unknown)}")
+        projection = ", ".join(f"s.{SUBTOPIC_COLUMNS[f]}" for f in fields)
+        response = self.execute_prepared(
+            f"""
+            MATCH (t:Topic {{id: $id}})
+            MATCH (t)<-[r:SUBTOPIC_OF]-(s:Subtopic)
+            RETURN {projection} ORDER BY r.position
+            """,
+            {"id": topic_id}
+        )
+        if HAS_ARROW:
+            for batch in response.get_as_arrow(self.ARROW_CHUNK_SIZE).to_batches():
+                yield [batch.column(i).to_pylist() for i in range(len(fields))]
+            return
+        # Bind the per-row methods once; this loop runs for every subtopic
+        has_next, get_next = response.has_next, response.get_next
+        rows = []
+        while has_next():
+            rows.append(get_next())
+            if len(rows) >= self.ARROW_CHUNK_SIZE:
+                yield [list(column) for column in zip(*rows)]
+                rows = []
+        if rows:
+            yield [list(column) for column in zip(*rows)]
+
+    @staticmethod
+    def _subtopic_from_row(fields: Tuple[str, ...], row: Any) -> Subtopic:
+        """Build a Subtopic from a projected row, leaving fields that were not fetched empty."""
+        values = dict(zip(fields, row))
+        return Subtopic(
+            id=values.get("id", ""),
+            name=values.get("name", ""),
+            full_text=values.get("full_text", ""),
+            bullet_points=values.get("bullet_points") or [],
+            image_metadata=values.get("image_metadata") or []
+        )
         
     def create_nested_subtopic(self, parent_id: str, subtopic: Subtopic, position: int = 0, 
                             parent_type: str = "Topic") -> bool:
@@ -222,135 +740,192 @@ class KuzuDBManager:
         :param parent_type: Type of the parent node ("Topic" or "Subtopic", default "Topic")
         :return: True if successful, False otherwise
         """
+        if parent_type == "Topic":
+            return self.create_nested_subtopic_under_topic(parent_id, subtopic, position)
+        return self.create_nested_subtopic_under_subtopic(parent_id, subtopic, position)
+
+    def create_nested_subtopic_under_topic(self, parent_id: str, subtopic: Subtopic, position: int = 0) -> bool:
+        """
+        Create a subtopic and link it to a parent Topic with SUBTOPIC_OF in a single statement.
+
+        :param parent_id: ID of the parent Topic
+        :param subtopic: Subtopic object to create and link
+        :param position: Order of the subtopic within its parent (default 0)
+        :return: True if successful, False otherwise
+        """
         try:
-            # First, ensure we have the SUBTOPIC_OF_SUBTOPIC relationship table
-            try:
-                self.conn.execute("""
-                    CREATE REL TABLE IF NOT EXISTS SUBTOPIC_OF_SUBTOPIC(
-                        FROM Subtopic TO Subtopic,
-                        position UINT32
-                    );
-                """)
-            except Exception as e:
-                print(f"Error creating SUBTOPIC_OF_SUBTOPIC relationship table: {e}")
-                return False
-                
-            # Prepare the subtopic data
-            image_metadata_json = json.dumps(subtopic.image_metadata)
-            
-            # Create the subtopic node regardless of parent type
-            self.conn.execute(
+            self._execute_write(
                 """
+                MATCH (p:Topic {id: $parent_id})
                 MERGE (s:Subtopic {id: $subtopic_id})
-                ON MATCH SET s.name = $name, s.text = $text, s.bullet_points = $bullet_points,
-                            s.image_metadata = $image_metadata
-                ON CREATE SET s.name = $name, s.text = $text, s.bullet_points = $bullet_points,
-                            s.image_metadata = $image_metadata
+                SET s.name = $name, s.text = $text, s.bullet_points = $bullet_points,
+                    s.image_metadata = $image_metadata
+                MERGE (s)-[r:SUBTOPIC_OF]->(p)
+                SET r.position = $position
                 """,
-                {
-                    "subtopic_id": subtopic.id,
-                    "name": subtopic.name,
-                    "text": subtopic.full_text,
-                    "bullet_points": subtopic.bullet_points,
-                    "image_metadata": image_metadata_json
-                }
+                self._nested_subtopic_params(parent_id, subtopic, position)
             )
-            
-            # Connect the subtopic to its parent based on parent type
-            if parent_type == "Topic":
-                self.conn.execute(
-                    """
-                    MATCH (s:Subtopic {id: $subtopic_id})
-                    MATCH (t:Topic {id: $parent_id})
-                    MERGE (s)-[r:SUBTOPIC_OF]->(t)
-                    ON MATCH SET r.position = $position
-                    ON CREATE SET r.position = $position
-                    """,
-                    {
-                        "subtopic_id": subtopic.id,
-                        "parent_id": parent_id,
-                        "position": position
-                    }
-                )
-            else:  # parent_type == "Subtopic"
-                self.conn.execute(
-                    """
-                    MATCH (s:Subtopic {id: $subtopic_id})
-                    MATCH (p:Subtopic {id: $parent_id})
-                    MERGE (s)-[r:SUBTOPIC_OF_SUBTOPIC]->(p)
-                    ON MATCH SET r.position = $position
-                    ON CREATE SET r.position = $position
-                    """,
-                    {
-                        "subtopic_id": subtopic.id,
-                        "parent_id": parent_id,
-                        "position": position
-                    }
-                )
-                
+            self._invalidate_subtopics()
             return True
         except Exception as e:
-            print(f"Error creating nested subtopic {subtopic.id} under {parent_type} {parent_id}: {e}")
+            print(f"Error creating nested subtopic {subtopic.id} under Topic {parent_id}: {e}")
             return False
-    def get_schema(self) -> str:
+
+    def create_nested_subtopic_under_subtopic(self, parent_id: str, subtopic: Subtopic, position: int = 0) -> bool:
         """
-        Retrieve the full schema from the KuzuDB database and return it as a structured string.
+        Create a subtopic and link it to a parent Subtopic with SUBTOPIC_OF_SUBTOPIC in a single statement.
+
+        :param parent_id: ID of the parent Subtopic
+        :param subtopic: Subtopic object to create and link
+        :param position: Order of the subtopic within its parent (default 0)
+        :return: True if successful, False otherwise
+        """
+        try:
+            self._execute_write(
+                """
+                MATCH (p:Subtopic {id: $parent_id})
+                MERGE (s:Subtopic {id: $subtopic_id})
+                SET s.name = $name, s.text = $text, s.bullet_points = $bullet_points,
+                    s.image_metadata = $image_metadata
+                MERGE (s)-[r:SUBTOPIC_OF_SUBTOPIC]->(p)
+                SET r.position = $position
+                """,
+                self._nested_subtopic_params(parent_id, subtopic, position)
+            )
+            self._invalidate_subtopics()
+            return True
+        except Exception as e:
+            print(f"Error creating nested subtopic {subtopic.id} under Subtopic {parent_id}: {e}")
+            return False
+
+    @staticmethod
+    def _nested_subtopic_params(parent_id: str, subtopic: Subtopic, position: int) -> Dict[str, Any]:
+        """Query parameters shared by the two create_nested_subtopic specializations."""
+        return {
+            "parent_id": parent_id,
+            "subtopic_id": subtopic.id,
+            "name": subtopic.name,
+            "text": subtopic.full_text,
+            "bullet_points": subtopic.bullet_points,
+            "image_metadata": _image_structs(subtopic.image_metadata),
+            "position": position
+        }
+
+    def get_graph_schema(self) -> GraphSchema:
+        """
+        Retrieve the full schema from the KuzuDB database as a structured GraphSchema.
+        The result is cached until the next DDL statement.
 
         Returns:
-            str: A structured string representation of the schema.
+            GraphSchema: Node, relationship and (sorted) property descriptions.
         """
+        with self._read_cache_lock:
+            if self._graph_schema_cache is not None:
+                return self._graph_schema_cache
+            version = self._catalog_version
         try:
             # Initialize structured schema components
             nodes = []
             relationships = []
             properties = []
 
-            # Get all tables using SHOW_TABLES
-            print("Executing SHOW_TABLES to retrieve all tables...")
-            response = self.conn.execute("CALL SHOW_TABLES() RETURN *;")
-            while response.has_next():
-                table_info = response.get_next()
+            # Get all tables using SHOW_TABLES (cached between DDL statements)
+            print("Retrieving all tables...")
+            for table_info in self._get_tables():
                 table_name = table_info[1]  # STRING
                 table_type = table_info[2]  # STRING (NODE or REL)
                 print(f"Found table: name={table_name}, type={table_type}")
 
-                # Get properties using TABLE_INFO
-                print(f"Retrieving properties for table: {table_name}")
-                prop_response = self.conn.execute(f"CALL TABLE_INFO('{table_name}') RETURN *;")
-                table_properties = []
-                while prop_response.has_next():
-                    prop_info = prop_response.get_next()
-                    prop_detail = f"{prop_info[1]} ({prop_info[2]}{', PK' if prop_info[4] else ''})"
-                    table_properties.append(prop_detail)
-                    properties.append(prop_detail)  # Add to global properties list
-
+                description, table_properties = self._describe_table(table_name, table_type)
+                properties.extend(table_properties)  # Add to global properties list
                 if table_type == "NODE":
-                    nodes.append(f"{table_name} {{ {', '.join(table_properties)} }}")
-                    print(f"Added to nodes: {nodes[-1]}")
+                    nodes.append(description)
+                    print(f"Added to nodes: {description}")
                 elif table_type == "REL":
-                    # Get connection details for relationships using SHOW_CONNECTION
-                    conn_response = self.conn.execute(f"CALL SHOW_CONNECTION('{table_name}') RETURN *;")
-                    if conn_response.has_next():
-                        conn_info = conn_response.get_next()
-                        rel_detail = f"{table_name} ({conn_info[0]} -> {conn_info[1]}) {{ {', '.join(table_properties)} }}"
-                        relationships.append(rel_detail)
-                        print(f"Added to relationships: {rel_detail}")
-                    else:
-                        relationships.append(f"{table_name} {{ {', '.join(table_properties)} }}")
-                        print(f"Added to relationships (no connections found): {relationships[-1]}")
-
-            # Construct structured string output
-            schema_str = "Graph Schema:\n"
-            schema_str += "Nodes:\n" + "\n".join(f"  - {node}" for node in nodes) + "\n" if nodes else "Nodes: None\n"
-            schema_str += "Relationships:\n" + "\n".join(f"  - {rel}" for rel in relationships) + "\n" if relationships else "Relationships: None\n"
-            schema_str += "Properties:\n" + "\n".join(f"  - {prop}" for prop in sorted(properties)) if properties else "Properties: None"
+                    relationships.append(description)
+                    print(f"Added to relationships: {description}")
 
             print("Finalizing schema retrieval...")
-            return schema_str
+            schema = GraphSchema(nodes=nodes, relationships=relationships, properties=sorted(properties))
+            with self._read_cache_lock:
+                if version == self._catalog_version:
+                    self._graph_schema_cache = schema
+            return schema
 
         except Exception as e:
             print(f"Error retrieving schema: {e}")
-            return "Graph Schema:\nNodes: None\nRelationships: None\nProperties: None"
+            return GraphSchema(nodes=[], relationships=[], properties=[])
+
+    def _describe_table(self, table_name: str, table_type: str) -> Tuple[str, List[str]]:
+        """
+        Describe one table via TABLE_INFO (and SHOW_CONNECTION for REL tables), cached per table.
+
+        :param table_name: Name of the node or relationship table.
+        :param table_type: Table type reported by SHOW_TABLES ("NODE" or "REL").
+        :return: Tuple of (schema line for the table, list of its property descriptions).
+        """
+        with self._read_cache_lock:
+            cached = self._table_descriptions.get(table_name)
+            if cached is not None:
+                return cached
+            version = self._catalog_version
+
+        # Get properties using TABLE_INFO
+        print(f"Retrieving properties for table: {table_name}")
+        prop_rows = self.execute(f"CALL TABLE_INFO('{table_name}') RETURN *;").get_all()
+        properties = [f"{prop_info[1]} ({prop_info[2]}{', PK' if prop_info[4] else ''})" for prop_info in prop_rows]
+        description = f"{table_name} {{ {', '.join(properties)} }}"
+
+        if table_type == "REL":
+            # Get connection details for relationships using SHOW_CONNECTION
+            conn_rows = self.execute(f"CALL SHOW_CONNECTION('{table_name}') RETURN *;").get_all()
+            if conn_rows:
+                conn_info = conn_rows[0]
+                description = f"{table_name} ({conn_info[0]} -> {conn_info[1]}) {{ {', '.join(properties)} }}"
+            else:
+                print(f"No connections found for relationship table: {table_name}")
+
+        with self._read_cache_lock:
+            if version == self._catalog_version:
+                self._table_descriptions[table_name] = (description, properties)
+        return description, properties
+
+    @staticmethod
+    def _format_schema(header: str, schema: GraphSchema) -> str:
+        """Render a GraphSchema as the structured text used by get_schema and get_table_schema."""
+        out = io.StringIO()
+        out.write(header)
+        out.write("\n")
+        for title, items, trailer in (("Nodes", schema.nodes, "\n"),
+                                      ("Relationships", schema.relationships, "\n"),
+                                      ("Properties", schema.properties, "")):
+            if not items:
+                out.write(f"{title}: None{trailer}")
+                continue
+            out.write(f"{title}:")
+            for item in items:
+                out.write("\n  - ")
+                out.write(item)
+            out.write(trailer)
+        return out.getvalue()
+
+    def get_schema(self) -> str:
+        """
+        Retrieve the full schema from the KuzuDB database and return it as a structured string.
+        The rendered string is cached alongside the GraphSchema until the next DDL statement.
+
+        Returns:
+            str: A structured string representation of the schema.
+        """
+        with self._read_cache_lock:
+            if self._schema_text_cache is not None:
+                return self._schema_text_cache
+        schema = self.get_graph_schema()
+        schema_str = self._format_schema("Graph Schema:", schema)
+        with self._read_cache_lock:
+            if self._graph_schema_cache is schema:  # Don't cache the empty schema returned on errors
+                self._schema_text_cache = schema_str
+        return schema_str
 
     def get_table_schema(self, identifier: str, by_id: bool = False) -> str:
         """
@@ -361,61 +936,38 @@ class KuzuDBManager:
             by_id (bool): If True, treat identifier as a table ID; otherwise, treat as a table name.
 
         Returns:
-            str: A structured string representation of the table schema.
+            str: A structured string representation of the table schema (cached until the next DDL).
         """
+        cache_key = (by_id, identifier)
+        with self._read_cache_lock:
+            table_schema_cache = self._table_schema_cache  # Replaced (not cleared) by DDL, so stale fills land in the old one
+        cached = self._cache_get(table_schema_cache, cache_key)
+        if cached is not None:
+            return cached
         try:
-            # Find the table using SHOW_TABLES with a filter
+            # Find the table in the cached SHOW_TABLES rows
+            _, tables_by_id, tables_by_name = self._get_table_index()
             if by_id:
-                response = self.conn.execute(
-                    "CALL SHOW_TABLES() RETURN * WHERE id = $id;",
-                    {"id": int(identifier)}  # UINT64
-                )
+                table_info = tables_by_id.get(int(identifier))  # UINT64
             else:
-                response = self.conn.execute(
-                    "CALL SHOW_TABLES() RETURN * WHERE name = $name;",
-                    {"name": identifier}
-                )
+                table_info = tables_by_name.get(identifier)
 
-            if not response.has_next():
+            if table_info is None:
                 print(f"Table with {'ID' if by_id else 'name'} '{identifier}' not found.")
                 return f"Graph Schema for {'ID' if by_id else 'name'} '{identifier}':\nNodes: None\nRelationships: None\nProperties: None"
 
-            table_info = response.get_next()
             table_name = table_info[1]  # STRING
             table_type = table_info[2]  # STRING (NODE or REL)
             print(f"Found table: name={table_name}, type={table_type}")
 
-            # Get properties using TABLE_INFO
-            prop_response = self.conn.execute(f"CALL TABLE_INFO('{table_name}') RETURN *;")
-            properties = []
-            while prop_response.has_next():
-                prop_info = prop_response.get_next()
-                prop_detail = f"{prop_info[1]} ({prop_info[2]}{', PK' if prop_info[4] else ''})"
-                properties.append(prop_detail)
-
-            # Initialize schema components
-            nodes = []
-            relationships = []
-            if table_type == "NODE":
-                nodes.append(f"{table_name} {{ {', '.join(properties)} }}")
-                print(f"Added to nodes: {nodes[-1]}")
-            elif table_type == "REL":
-                conn_response = self.conn.execute(f"CALL SHOW_CONNECTION('{table_name}') RETURN *;")
-                if conn_response.has_next():
-                    conn_info = conn_response.get_next()
-                    rel_detail = f"{table_name} ({conn_info[0]} -> {conn_info[1]}) {{ {', '.join(properties)} }}"
-                    relationships.append(rel_detail)
-                    print(f"Added to relationships: {rel_detail}")
-                else:
-                    relationships.append(f"{table_name} {{ {', '.join(properties)} }}")
-                    print(f"Added to relationships (no connections found): {relationships[-1]}")
+            description, properties = self._describe_table(table_name, table_type)
+            nodes = [description] if table_type == "NODE" else []
+            relationships = [description] if table_type == "REL" else []
 
             # Construct structured string output
-            schema_str = f"Graph Schema for {'ID' if by_id else 'name'} '{identifier}':\n"
-            schema_str += "Nodes:\n" + "\n".join(f"  - {node}" for node in nodes) + "\n" if nodes else "Nodes: None\n"
-            schema_str += "Relationships:\n" + "\n".join(f"  - {rel}" for rel in relationships) + "\n" if relationships else "Relationships: None\n"
-            schema_str += "Properties:\n" + "\n".join(f"  - {prop}" for prop in sorted(properties)) if properties else "Properties: None"
-
+            schema = GraphSchema(nodes=nodes, relationships=relationships, properties=sorted(properties))
+            schema_str = self._format_schema(f"Graph Schema for {'ID' if by_id else 'name'} '{identifier}':", schema)
+            self._cache_put(table_schema_cache, cache_key, schema_str, self.TABLE_SCHEMA_CACHE_SIZE)
             return schema_str
 
         except Exception as e:
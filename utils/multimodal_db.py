@@ -1,5 +1,12 @@
 import os
+import io
 import uuid
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 import lancedb
 from lancedb.pydantic import LanceModel, Vector
 from lancedb.embeddings import get_registry
@@ -12,6 +19,8 @@ from transformers import AutoModel, AutoImageProcessor
 load_dotenv()
 from PIL import Image
 import torch
+import numpy as np
+import pyarrow as pa
 # Load environment variables with defaults
 DB_URI = os.getenv("LANCEDB_URI", "./lancedb")
 TABLE_NAME = os.getenv("LANCEDB_TABLE", "multimodal_table")
@@ -21,20 +30,126 @@ IMAGE_EMBEDDER_MODEL = os.getenv("IMAGE_EMBEDDER_MODEL", "facebook/dinov2-base-i
 from logging import getLogger
 import logging
 HF_TOKEN = os.getenv("HF_TOKEN", None)  # Load token from .env, if available
+IMAGE_EMBED_DIM = int(os.getenv("IMAGE_EMBED_DIM", "768"))  # Output size of IMAGE_EMBEDDER_MODEL
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "4096"))  # Image embeddings kept in memory
+EMBED_DISK_CACHE_SIZE = int(os.getenv("EMBED_DISK_CACHE_SIZE", "65536"))  # .npy files kept under <LANCEDB_URI>/emb_cache
+IMAGE_EMBED_BATCH_SIZE = int(os.getenv("IMAGE_EMBED_BATCH_SIZE", "32"))  # Images per model forward pass
+PK_VECTOR_CACHE_SIZE = int(os.getenv("PK_VECTOR_CACHE_SIZE", "1024"))  # image_vector by pk, for image_search_by_pk
+IMAGE_INDEX_MIN_ROWS = int(os.getenv("IMAGE_INDEX_MIN_ROWS", "5000"))  # Below this, brute force is fast enough
+RESULT_COLUMNS = ["pk", "text", "image_path", "file_path"]  # Columns returned by searches (no vectors)
+
+def new_pk() -> str:
+    """Return a random primary key: a uuid4 as 22-char url-safe base64 instead of 32 hex chars."""
+    return base64.urlsafe_b64encode(uuid.uuid4().bytes).rstrip(b"=").decode("ascii")
+
 class DINOv3Embedding:
-    def __init__(self, model_name=IMAGE_EMBEDDER_MODEL, token=HF_TOKEN, dim=768):
-        self.model = AutoModel.from_pretrained(model_name, token=token)
+    def __init__(self, model_name=IMAGE_EMBEDDER_MODEL, token=HF_TOKEN, dim=IMAGE_EMBED_DIM, batch_size=IMAGE_EMBED_BATCH_SIZE, uri=DB_URI):
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        # Half precision on GPU (tensor cores); CPUs keep float32, where fp16 kernels are slow or missing
+        if self.device == "cuda":
+            self.dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        else:
+            self.dtype = torch.float32
+        self.model = AutoModel.from_pretrained(model_name, token=token).to(self.device, dtype=self.dtype).eval()
         self.processor = AutoImageProcessor.from_pretrained(model_name, token=token)
         self._ndims = dim
+        self.batch_size = batch_size
+        self._loader = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
+        # Content-addressed embedding cache: in-memory LRU in front of .npy files on disk
+        self.model_name = model_name
+        self.cache_dir = os.path.join(uri, "emb_cache")  # Per database, so two databases never share a cache
+        self._emb_cache = OrderedDict()  # key -> float32 ndarray (a list of floats would be ~8x larger)
+        self._cache_lock = threading.Lock()
+        self._disk_entries = None  # Number of .npy files in cache_dir, counted on the first write
         self.logger = getLogger(__name__)
         # Configure logger
         logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
         self.logger.debug(f"DINOv3Embedding initialized with model: {model_name}, dim: {dim}")
 
+    def close(self):
+        # Stop the file-reading/decoding threads; the embedder must not be used afterwards
+        self._loader.shutdown(wait=True)
+
     def ndims(self):
         self.logger.debug(f"Returning embedding dimensions: {self._ndims}")
         return self._ndims
 
+    def _read_source(self, src):
+        # Key = model name + file contents, so an unchanged image maps to the same cached embedding
+        with open(src, "rb") as f:
+            data = f.read()
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(self.model_name.encode() + b"\0")
+        digest.update(data)
+        return digest.hexdigest(), data
+
+    @staticmethod
+    def _load_image(data):
+        img = Image.open(io.BytesIO(data))
+        img.load()  # Decode here (PIL releases the GIL) rather than lazily in the processor
+        return img
+
+    def _cache_get(self, key):
+        # Entries are float32 arrays; callers get a fresh list of floats
+        with self._cache_lock:
+            emb = self._emb_cache.get(key)
+            if emb is not None:
+                self._emb_cache.move_to_end(key)
+                return emb.tolist()
+        path = os.path.join(self.cache_dir, f"{key}.npy")
+        try:
+            emb = np.load(path)
+            os.utime(path)  # The mtime orders disk eviction, so a hit marks the file as recently used
+        except (OSError, ValueError):  # Missing or unreadable file
+            return None
+        self._cache_put(key, emb, persist=False)
+        return emb.tolist()
+
+    def _cache_put(self, key, emb, persist=True):
+        emb = np.asarray(emb, dtype=np.float32)
+        with self._cache_lock:
+            self._emb_cache[key] = emb
+            self._emb_cache.move_to_end(key)
+            if len(self._emb_cache) > EMBED_CACHE_SIZE:
+                self._emb_cache.popitem(last=False)
+        if persist:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                np.save(os.path.join(self.cache_dir, f"{key}.npy"), emb)
+            except OSError as e:
+                self.logger.error(f"Could not persist embedding {key}: {e}")
+                return
+            self._count_disk_entry()
+
+    def _count_disk_entry(self):
+        with self._cache_lock:
+            if self._disk_entries is None:
+                self._disk_entries = sum(1 for entry in os.scandir(self.cache_dir) if entry.name.endswith(".npy"))
+            else:
+                self._disk_entries += 1
+            if self._disk_entries <= EMBED_DISK_CACHE_SIZE:
+                return
+            self._disk_entries = self._prune_disk_cache()
+
+    def _prune_disk_cache(self):
+        # Drop the least recently used files down to 90% of the cap, so pruning doesn't run on every write
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".npy"):
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass
+        files.sort()
+        excess = len(files) - int(EMBED_DISK_CACHE_SIZE * 0.9)
+        for _, path in files[:max(excess, 0)]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                self.logger.error(f"Could not evict cached embedding {path}: {e}")
+        self.logger.debug(f"Evicted {max(excess, 0)} cached embeddings from {self.cache_dir}.")
+        return len(files) - max(excess, 0)
+
     def compute_embeddings(self, sources: List[Optional[str]]) -> List[Optional[List[float]]]:
         self.logger.debug(f"Computing embeddings for sources: {sources}")
         non_none_indices = [i for i, src in enumerate(sources) if src is not None]
@@ -44,34 +159,64 @@ class DINOv3Embedding:
             self.logger.debug("No valid sources provided for embedding computation.")
             return [None] * len(sources)
 
-        imgs = [Image.open(src) for src in non_none_sources]
-        self.logger.debug(f"Loaded {len(imgs)} images for embedding computation.")
-        inputs = self.processor(images=imgs, return_tensors="pt")
+        # Read and hash the files on the thread pool; images seen before skip the model entirely
+        embeddings = [None] * len(sources)
+        misses = []
+        for idx, (key, data) in zip(non_none_indices, self._loader.map(self._read_source, non_none_sources)):
+            cached = self._cache_get(key)
+            if cached is not None:
+                embeddings[idx] = cached
+            else:
+                misses.append((idx, key, data))
+        self.logger.debug(f"Embedding cache hits: {len(non_none_sources) - len(misses)}, misses: {len(misses)}.")
+        if not misses:
+            return embeddings
 
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-            cls_embs = outputs.last_hidden_state[:, 0, :].cpu().numpy()
-            self.logger.debug(f"Computed embeddings for {len(cls_embs)} images.")
+        # Run the model in fixed-size batches so large inputs don't load every image at once.
+        # Images are decoded on a thread pool, and the next batch is decoded while the
+        # model runs on the current one.
+        chunks = [misses[i:i + self.batch_size] for i in range(0, len(misses), self.batch_size)]
+        pending = [self._loader.submit(self._load_image, data) for _, _, data in chunks[0]]
+        batch_embs = []
+        for chunk_index in range(len(chunks)):
+            imgs = [future.result() for future in pending]
+            if chunk_index + 1 < len(chunks):
+                pending = [self._loader.submit(self._load_image, data) for _, _, data in chunks[chunk_index + 1]]
+            self.logger.debug(f"Loaded {len(imgs)} images for embedding computation.")
+            inputs = self.processor(images=imgs, return_tensors="pt")
+            # Only floating tensors (pixel_values) take the model dtype; integer or mask tensors keep theirs
+            inputs = {k: v.to(self.device, dtype=self.dtype) if v.is_floating_point() else v.to(self.device)
+                      for k, v in inputs.items()}
 
-        embeddings = [None] * len(sources)
-        for idx, emb in zip(non_none_indices, cls_embs):
+            with torch.inference_mode(), torch.autocast(device_type=self.device, dtype=self.dtype, enabled=self.device == "cuda"):
+                outputs = self.model(**inputs)
+                # Back to float32 so the stored vectors keep the same layout
+                batch_embs.append(outputs.last_hidden_state[:, 0, :].float().cpu().numpy())
+        cls_embs = np.concatenate(batch_embs)
+        self.logger.debug(f"Computed embeddings for {len(cls_embs)} images.")
+
+        for (idx, key, _), emb in zip(misses, cls_embs):
             embeddings[idx] = emb.tolist()
+            self._cache_put(key, emb.copy())  # A copy, so the cache doesn't pin the whole batch array
 
         self.logger.debug(f"Final embeddings created for {len(embeddings)} sources.")
         return embeddings
 
 
 class MultimodalDB:
-    def __init__(self, uri=DB_URI, table_name=TABLE_NAME, embedder_model=EMBEDDER_MODEL, image_embedder_model=IMAGE_EMBEDDER_MODEL):
+    def __init__(self, uri=DB_URI, table_name=TABLE_NAME, embedder_model=EMBEDDER_MODEL, image_embedder_model=IMAGE_EMBEDDER_MODEL, rebuild_fts=False):
         self.logger = getLogger(__name__)
         self.logger.debug(f"Initializing MultimodalDB with URI: {uri}, Table: {table_name}")
+        self.uri = uri
         self.db = lancedb.connect(uri)
-        if embedding_provider=="huggingface":
-            self.embedder = get_registry().get("huggingface").create(name=embedder_model)
-        elif embedding_provider=="ollama":
-            self.embedder = get_registry().get("ollama").create(name=embedder_model)
-        self.image_embedder = DINOv3Embedding(model_name=image_embedder_model)
-        self.Schema = self.get_schema(self.embedder, image_embedder=self.image_embedder)
+        # The embedders are loaded on first use (see the properties below): an existing table
+        # carries its own text embedding function, and only image ingest/search needs DINOv2
+        self.embedder_model = embedder_model
+        self.image_embedder_model = image_embedder_model
+        self.reranker = RRFReranker()  # Stateless, so one instance is shared by all searches
+        # image_vector by pk so repeat image_search_by_pk calls skip the lookup round trip
+        self._pk_vectors = OrderedDict()
+        self._pk_vectors_lock = threading.Lock()
 
         if table_name in self.db.table_names():
             self.logger.debug(f"Opening existing table: {table_name}")
@@ -80,48 +225,200 @@ class MultimodalDB:
             self.logger.debug(f"Creating new table: {table_name}")
             self.table = self.db.create_table(table_name, schema=self.Schema, mode="overwrite")
 
+        # Only build the full-text index when it is missing. Rows added later are not in it until
+        # a caller runs refresh_fts_index() after its bulk ingest; pass rebuild_fts=True (or call
+        # rebuild_fts_index()) to re-index all rows
+        if rebuild_fts or not self._has_fts_index():
+            self.rebuild_fts_index()
+        else:
+            self.logger.debug("Full-text search index for 'text' column already exists.")
+
+        # Scalar-quantized (int8) ANN index for image search, once there are enough rows to train it
+        self._image_index_ready = self._has_index("image_vector")
+        if not self._image_index_ready:
+            self.build_image_vector_index()
+
+    @cached_property
+    def embedder(self):
+        if embedding_provider == "huggingface":
+            return get_registry().get("huggingface").create(name=self.embedder_model)
+        elif embedding_provider == "ollama":
+            return get_registry().get("ollama").create(name=self.embedder_model)
+        raise ValueError(f"Unsupported EMBEDDING_PROVIDER: {embedding_provider}")
+
+    @cached_property
+    def image_embedder(self):
+        return DINOv3Embedding(model_name=self.image_embedder_model, uri=self.uri)
+
+    @cached_property
+    def Schema(self):
+        return self.get_schema(self.embedder, image_dims=IMAGE_EMBED_DIM)
+
+    def _has_index(self, column: str, index_kind: str = "") -> bool:
+        try:
+            return any(
+                column in idx.columns and index_kind in str(idx.index_type).upper()
+                for idx in self.table.list_indices()
+            )
+        except Exception as e:
+            self.logger.debug(f"Could not list indices, assuming no index on '{column}': {e}")
+            return False
+
+    def _has_fts_index(self) -> bool:
+        return self._fts_index_name() is not None
+
+    def _fts_index_name(self) -> Optional[str]:
+        try:
+            for idx in self.table.list_indices():
+                if "text" in idx.columns and "FTS" in str(idx.index_type).upper():
+                    return idx.name
+        except Exception as e:
+            self.logger.debug(f"Could not list indices, assuming no FTS index on 'text': {e}")
+        return None
+
+    def rebuild_fts_index(self):
         self.table.create_fts_index("text", replace=True)
         self.logger.debug("Full-text search index created for 'text' column.")
 
-    def get_schema(self, text_embedder, image_embedder):
+    def refresh_fts_index(self):
+        # Rows added after the FTS index was built are missing from the FTS leg of hybrid search
+        # until they are indexed; optimize() folds them into the existing index. optimize() also
+        # compacts the table, so call this once after a bulk ingest, not after every insert
+        name = self._fts_index_name()
+        if name is None:
+            self.rebuild_fts_index()
+            return
+        try:
+            unindexed = self.table.index_stats(name).num_unindexed_rows
+        except Exception as e:
+            self.logger.debug(f"Could not read stats for index '{name}', re-indexing: {e}")
+            unindexed = None
+        if unindexed == 0:
+            return
+        try:
+            self.table.optimize()
+            self.logger.debug(f"Full-text search index updated with {unindexed} new rows.")
+        except Exception as e:
+            self.logger.error(f"Failed to update the full-text search index, rebuilding it: {e}")
+            self.rebuild_fts_index()
+
+    def build_image_vector_index(self, min_rows=IMAGE_INDEX_MIN_ROWS):
+        # IVF_HNSW_SQ stores image vectors as int8 codes in the index (4x fewer bytes scanned
+        # than float32) and LanceDB quantizes query vectors the same way; the float32 column is kept
+        row_count = self.table.count_rows()
+        if row_count < min_rows:
+            self.logger.debug(f"Skipping image_vector index: {row_count} rows < {min_rows}.")
+            return
+        try:
+            self.table.create_index(vector_column_name="image_vector", index_type="IVF_HNSW_SQ", replace=True)
+            self._image_index_ready = True
+            self.logger.debug("Scalar-quantized IVF_HNSW_SQ index created for 'image_vector' column.")
+        except Exception as e:
+            self.logger.error(f"Failed to create image_vector index: {e}")
+
+    def close(self):
+        # Shut down the image embedder's thread pool if it was ever loaded
+        embedder = self.__dict__.pop("image_embedder", None)  # cached_property values live in the instance dict
+        if embedder is not None:
+            embedder.close()
+
+    def _pk_vector_get(self, pk):
+        with self._pk_vectors_lock:
+            vec = self._pk_vectors.get(pk)
+            if vec is not None:
+                self._pk_vectors.move_to_end(pk)
+            return vec
+
+    def _pk_vector_put(self, pk, vec):
+        with self._pk_vectors_lock:
+            self._pk_vectors[pk] = vec
+            self._pk_vectors.move_to_end(pk)
+            if len(self._pk_vectors) > PK_VECTOR_CACHE_SIZE:
+                self._pk_vectors.popitem(last=False)
+
+    def _clear_pk_vectors(self):
+        # Deletes and updates take arbitrary SQL conditions, so drop every cached vector
+        with self._pk_vectors_lock:
+            self._pk_vectors.clear()
+
+    def get_schema(self, text_embedder, image_dims=IMAGE_EMBED_DIM):
         self.logger.debug("Defining schema for the database.")
         class Schema(LanceModel):
-            pk: str = Field(default_factory=lambda: uuid.uuid4().hex)  # Add primary key
+            pk: str = Field(default_factory=new_pk)  # Add primary key
             text: Optional[str] = text_embedder.SourceField(default=None)
-            text_vector: Vector(text_embedder.ndims()) = text_embedder.VectorField()
+            # Half precision halves the bytes hybrid search scans; existing float32 tables are left as they are
+            text_vector: Vector(text_embedder.ndims(), value_type=pa.float16()) = text_embedder.VectorField()
             image_path: Optional[str]
-            image_vector: Optional[Vector(image_embedder.ndims())]
+            image_vector: Optional[Vector(image_dims)]
             file_path: Optional[str]
 
         return Schema
 
     def add_entries(self, entries: List[dict]):
         self.logger.debug(f"Adding entries to the database: {entries}")
-        for entry in entries:
-            if "file_path" in entry and entry["file_path"]:
-                self.logger.debug(f"Computing image embedding for entry: {entry['file_path']}")
-                image_embedding = self.image_embedder.compute_embeddings([entry["file_path"]])[0]
-                entry["image_vector"] = image_embedding
-            else:
-                self.logger.debug("No file_path provided or empty, setting image_vector to None.")
-                entry["image_vector"] = None
+        # Embed all images in one call (batched inside compute_embeddings) instead of one
+        # model call per entry; compute_embeddings returns None for entries without a file_path.
+        # Text-only batches never touch image_embedder, so the image model is not loaded for them.
+        file_paths = [entry.get("file_path") or None for entry in entries]
+        if any(file_paths):
+            self.logger.debug(f"Computing image embeddings for {sum(p is not None for p in file_paths)} entries.")
+            image_embeddings = self.image_embedder.compute_embeddings(file_paths)
+        else:
+            image_embeddings = [None] * len(entries)
+        for entry, image_embedding in zip(entries, image_embeddings):
+            entry.setdefault("pk", new_pk())  # Arrow input does not go through the Schema defaults
+            entry["image_vector"] = image_embedding
 
-        self.table.add(entries)
+        # text_vector is left out so LanceDB fills it from the text column with the embedding function
+        self.table.add(self._entries_to_arrow(entries))
         self.logger.debug("Entries added successfully.")
-        sample = self.table.to_pandas()
-        print("SAMPLE ROWS:\n", sample)
+        if not self._image_index_ready:
+            # Build the image index as soon as the table grows past IMAGE_INDEX_MIN_ROWS, not on the next restart
+            self.build_image_vector_index()
+        for entry in entries:
+            if entry.get("pk") and entry.get("image_vector") is not None:
+                self._pk_vector_put(entry["pk"], entry["image_vector"])
+        if self.logger.isEnabledFor(logging.DEBUG):
+            # Only a few rows, without vectors; the whole table is never materialized
+            self.logger.debug(f"SAMPLE ROWS:\n{self.table.search().select(RESULT_COLUMNS).limit(5).to_pandas()}")
+            self.logger.debug(f"TABLE SCHEMA: {self.table.schema}")
 
-        # 2. Try printing schema information (best-effort — API varies with lancedb versions)
-        try:
-            print("TABLE SCHEMA (repr):", getattr(self.table, "schema", None))
-            # fallback: try ._schema or ._meta if available
-            print("TABLE ATTRS:", {k: getattr(self.table, k) for k in dir(self.table) if "schema" in k.lower() or "meta" in k.lower()})
-        except Exception as e:
-            print("Could not fetch table.schema via attribute: ", e)
+    def _entries_to_arrow(self, entries: List[dict]) -> pa.Table:
+        # Build the columns directly instead of letting LanceDB convert a list of dicts row by row;
+        # image_vector becomes one contiguous float32 buffer with a validity bitmap for missing images
+        schema = self.table.schema
+        dim = schema.field("image_vector").type.list_size
+        valid = np.array([entry["image_vector"] is not None for entry in entries], dtype=bool)
+        vectors = np.zeros((len(entries), dim), dtype=np.float32)
+        if valid.any():
+            vectors[valid] = np.asarray([entry["image_vector"] for entry in entries if entry["image_vector"] is not None], dtype=np.float32)
+        image_vectors = pa.Array.from_buffers(
+            schema.field("image_vector").type,
+            len(entries),
+            [pa.py_buffer(np.packbits(valid, bitorder="little"))],
+            null_count=int((~valid).sum()),
+            children=[pa.array(vectors.ravel())],
+        )
+        columns = {
+            name: pa.array([entry.get(name) for entry in entries], type=schema.field(name).type)
+            for name in RESULT_COLUMNS
+        }
+        columns["image_vector"] = image_vectors
+        return pa.table(columns)
+
+    def _image_vector_search(self, query_vec, top_k: int, where: Optional[str] = None):
+        # Below IMAGE_INDEX_MIN_ROWS this is an exact float32 scan of image_vector, which is cheap at
+        # that size; from there on the IVF_HNSW_SQ index (built by build_image_vector_index) serves it
+        search = self.table.search(query_vec, vector_column_name="image_vector", query_type="vector")
+        if where:
+            search = search.where(where, prefilter=True)
+        # Vectors are never decoded; _distance is still returned
+        return search.select(RESULT_COLUMNS).limit(top_k).to_list()
 
     def delete_entry(self, condition: str):
         self.logger.debug(f"Deleting entries with condition")
         self.table.delete(condition)
+        self._clear_pk_vectors()
         self.logger.debug("Entries deleted successfully.")
 
     def update_entries(self, where: str, values: dict = None, values_sql: dict = None):
@@ -134,47 +431,44 @@ class MultimodalDB:
             values["image_vector"] = None
 
         self.table.update(where=where, values=values, values_sql=values_sql)
+        self._clear_pk_vectors()
         self.logger.debug("Entries updated successfully.")
 
     def drop_table(self):
         self.logger.debug(f"Dropping table: {TABLE_NAME}")
         self.db.drop_table(TABLE_NAME)
+        self._clear_pk_vectors()
         self.logger.debug("Table dropped successfully.")
 
-    def hybrid_search_with_rerank(self, query: str, top_k: int = 10):
+    def hybrid_search_with_rerank(self, query: str, top_k: int = 10, as_arrow: bool = False):
         self.logger.debug(f"Performing hybrid search with query: {query}, top_k: {top_k}")
-        reranker = RRFReranker()
-        result = (
+        search = (
             self.table.search(query, query_type="hybrid",vector_column_name="text_vector",fts_columns=["text"])
-            .rerank(reranker=reranker)
+            .select(RESULT_COLUMNS)  # Never decode the vector columns into Python
+            .rerank(reranker=self.reranker)
             .limit(top_k)
-            .to_list()
         )
+        # as_arrow returns a pyarrow.Table for callers that can skip building per-row dicts
+        result = search.to_arrow() if as_arrow else search.to_list()
         self.logger.debug(f"Hybrid search results ")
         return result
     def image_search_by_pk(self, pk: str, top_k: int = 10):
         self.logger.debug(f"Performing image search by pk: {pk}, top_k: {top_k}")
-        # Query the table to get the image_vector for the given pk
-        result = self.table.search().where(f"pk = '{pk}'").limit(1).to_list()
-        if not result:
-            self.logger.error(f"No entry found for pk: {pk}")
-            raise ValueError(f"No entry found for pk: {pk}")
-        query_vec = result[0].get("image_vector")
+        query_vec = self._pk_vector_get(pk)
         if query_vec is None:
-            self.logger.error(f"No image_vector associated with pk: {pk}")
-            raise ValueError(f"No image_vector associated with pk: {pk}")
+            # Query the table to get the image_vector for the given pk
+            result = self.table.search().where(f"pk = '{pk}'").select(["image_vector"]).limit(1).to_list()
+            if not result:
+                self.logger.error(f"No entry found for pk: {pk}")
+                raise ValueError(f"No entry found for pk: {pk}")
+            query_vec = result[0].get("image_vector")
+            if query_vec is None:
+                self.logger.error(f"No image_vector associated with pk: {pk}")
+                raise ValueError(f"No image_vector associated with pk: {pk}")
+            self._pk_vector_put(pk, query_vec)
 
-        # Perform image search using the precomputed image_vector
-        result = (
-            self.table.search(query_vec, vector_column_name="image_vector", query_type="vector")
-            .limit(top_k)
-            .to_list()
-        )
-        # Filter out results with the same pk as the input and remove vector fields
-        result = [res for res in result if res["pk"] != pk]
-        for res in result:
-            res.pop("text_vector", None)
-            res.pop("image_vector", None)
+        # Perform image search using the precomputed image_vector, excluding the query row before ranking
+        result = self._image_vector_search(query_vec, top_k, where=f"pk != '{pk}'")
         self.logger.debug(f"Image search results: {result[0] if result else 'None'}")
         return result
     def image_search(self, query_file_path: str, top_k: int = 10):
@@ -183,15 +477,7 @@ class MultimodalDB:
         if query_vec is None:
             self.logger.error("Failed to embed query image.")
             raise ValueError("Failed to embed query image.")
-        result = (
-            self.table.search(query_vec, vector_column_name="image_vector", query_type="vector") 
-            .limit(top_k)
-            .to_list()
-        )
-        for res in result:
-            if "text_vector" in res:
-                del res["text_vector"]
-                del res["image_vector"]
+        result = self._image_vector_search(query_vec, top_k)
         self.logger.debug(f"Image search results: {result[0]}")
         return result
 
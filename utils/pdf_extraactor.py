@@ -1,22 +1,120 @@
 import asyncio
-import json
 import os
-import uuid
+import hashlib
 import fitz  # PyMuPDF for PDF processing
 from typing import List, Dict, Optional, Any, Tuple
 from dataclasses import dataclass, field
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from kuzu_init import KuzuDBManager, Topic, Subtopic  # Import from your provided script
-import re
 import spacy
-import aiohttp
-from sklearn.cluster import KMeans
-from sentence_transformers import SentenceTransformer
-import pytextrank
 from groq import Groq
 from celerbud import BAMLFunctions  # Assuming BAMLFunctions is defined in baml.py
-# Load spaCy model
-nlp = spacy.load("en_core_web_md")
-nlp.add_pipe("textrank")  # Add TextRank component to the pipeline
+# Load spaCy model; only POS tags are used, so the parser, NER and lemmatizer are never loaded
+nlp = spacy.load("en_core_web_md", exclude=["parser", "ner", "lemmatizer"])
+# Components needed for token.pos_: the tagger sets tag_ and the attribute ruler maps it to pos_
+POS_PIPES = ("tok2vec", "tagger", "attribute_ruler")
+
+# Pages scanned for subtopic headings (the first pages are also used for the title)
+SUBTOPIC_MAX_PAGES = 50
+
+# BAML calls in flight at once when fanning out per-subtopic requests, kept modest for provider rate limits
+LLM_CONCURRENCY = 8
+
+# Number of threads writing extracted images to disk while pages are still being parsed
+IMAGE_WRITE_WORKERS = 8
+
+
+def _stable_id(*parts: str) -> str:
+    """Deterministic 128-bit hex ID, so re-ingesting the same PDF MERGEs onto the same nodes."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _groq_client(api_key: str) -> Groq:
+    """Groq client shared by every PDFKnowledgeGraph (one per upload), so its HTTP connection pool is reused."""
+    return Groq(api_key=api_key)
+
+
+def _write_image(image_path: str, image_bytes: bytes) -> None:
+    # Unbuffered: the bytes are already in memory, so skip the buffered-IO copy
+    fd = os.open(image_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(image_bytes)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def _is_plain_jpeg(doc: fitz.Document, xref: int) -> bool:
+    """True if the image stream is a JPEG with no other filter and no /Decode array, so its raw bytes are a valid .jpeg.
+
+    get_images only reports the last filter; chained filters (e.g. [/FlateDecode /DCTDecode]) or a
+    /Decode array (e.g. inverted CMYK) would make the raw copy a corrupt file.
+    """
+    filter_type, filter_value = doc.xref_get_key(xref, "Filter")
+    if filter_type != "name" or filter_value != "/DCTDecode":
+        return False
+    return doc.xref_get_key(xref, "Decode")[0] == "null"
+
+
+def _extract_page(doc: fitz.Document, page_num: int, output_dir: str, with_blocks: bool) -> Tuple[str, List[Tuple[Dict[str, str], bytes]], Optional[List[Dict[str, Any]]]]:
+    """Extract one page's text, image bytes (with their metadata) and, optionally, its text dict."""
+    page = doc[page_num]  # Explicitly access page by index
+    print(f"Processing page {page_num + 1}/{len(doc)}")
+    page_text = ""
+    try:
+        text = page.get_text("text") # type: ignore[attr-defined]
+        if text:
+            page_text = text + "\n"
+    except Exception as e:
+        print(f"Warning: Could not extract text from page {page_num + 1}. Error: {e}")
+        page_text = f"[Page {page_num + 1} text extraction failed]\n"
+
+    # Parse the text dict while the page is loaded, for the heading detection that follows
+    blocks = None
+    if with_blocks:
+        try:
+            blocks = page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"] # type: ignore[attr-defined]
+        except Exception as e:
+            print(f"Warning: Could not read text blocks from page {page_num + 1}. Error: {e}")
+
+    # Extract images
+    try:
+        image_list = page.get_images(full=True)
+    except Exception as e:
+        print(f"Warning: Could not get images from page {page_num + 1}. Error: {e}")
+        image_list = []
+
+    images = []
+    for img_index, img in enumerate(image_list):
+        print(f"Extracting image {img_index + 1} from page {page_num + 1}")
+        xref, smask = img[0], img[1]
+        try:
+            if not smask and _is_plain_jpeg(doc, xref):
+                # A plain JPEG stream is already a complete .jpeg file: copy it without decoding
+                image_bytes, image_ext = doc.xref_stream_raw(xref), "jpeg"
+            else:
+                base_image = doc.extract_image(xref)
+                if not base_image: # Check if extraction was successful
+                     print(f"Warning: Failed to extract image data for xref {xref} on page {page_num + 1}")
+                     continue
+                image_bytes, image_ext = base_image["image"], base_image["ext"]
+            image_name = f"page_{page_num + 1}_img_{img_index + 1}.{image_ext}" # Page num 1-based
+            images.append(({
+                "image_path": os.path.join(output_dir, image_name),
+                "image_name": image_name,
+                "page_number": str(page_num + 1) # Store 1-based page number
+            }, image_bytes))
+        except Exception as e:
+             print(f"Warning: Error processing image xref {xref} on page {page_num + 1}. Error: {e}")
+    return page_text, images, blocks
+
 
 @dataclass
 class PDFKnowledgeGraph:
@@ -28,77 +126,90 @@ class PDFKnowledgeGraph:
     def __post_init__(self):
         # Instantiate BAMLFunctions
         self.baml = BAMLFunctions(kuzu_client=self.db_manager)
+        # Text dicts ("blocks") per page of the open document, shared by the title and subtopic passes
+        self._page_blocks_cache: Dict[int, List[Dict[str, Any]]] = {}
         """Initialize output directory and validate PDF path."""
         print(f"Initializing PDFKnowledgeGraph for PDF: {self.pdf_path}")
 
 
-    def extract_text_and_images(self) -> tuple[str, List[Dict[str, str]]]:
-        """Extract full text and images from the PDF, saving images to output_dir."""
-        print(f"Opening PDF: {self.pdf_path}")
-        if not os.path.exists(self.pdf_path):
-             raise FileNotFoundError(f"PDF file not found at: {self.pdf_path}")
+    def extract_text_and_images(self, doc: Optional[fitz.Document] = None) -> tuple[str, List[Dict[str, str]]]:
+        """Extract full text and images from the PDF, saving images to output_dir.
 
-        try:
-            doc = fitz.open(self.pdf_path)
-        except Exception as e:
-            print(f"Error opening PDF {self.pdf_path}: {e}")
-            raise
+        Pass an already open doc to reuse it; it is then left open for the caller, and the
+        text dicts of the first SUBTOPIC_MAX_PAGES pages are kept for the subtopic pass.
+        """
+        owns_doc = doc is None
+        if owns_doc:
+            print(f"Opening PDF: {self.pdf_path}")
+            if not os.path.exists(self.pdf_path):
+                 raise FileNotFoundError(f"PDF file not found at: {self.pdf_path}")
 
-        full_text = ""
-        image_metadata = []
+            try:
+                doc = fitz.open(self.pdf_path)
+            except Exception as e:
+                print(f"Error opening PDF {self.pdf_path}: {e}")
+                raise
 
         # Ensure output directory exists before saving images
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
             print(f"Created missing output directory: {self.output_dir}")
 
-        for page_num in range(len(doc)):  # Replace enumerate(doc)
-            page = doc[page_num]  # Explicitly access page by index
-            print(f"Processing page {page_num + 1}/{len(doc)}")
-            try:
-                page_text = page.get_text("text") # type: ignore[attr-defined]
-                if page_text:
-                    full_text += page_text + "\n"
-            except Exception as e:
-                print(f"Warning: Could not extract text from page {page_num + 1}. Error: {e}")
-                full_text += f"[Page {page_num + 1} text extraction failed]\n"
-
+        # Keep text dicts only when the caller goes on to use this document for headings
+        blocks_limit = 0 if owns_doc else SUBTOPIC_MAX_PAGES
+        pages = self._extract_pages(doc, blocks_limit)
 
-            # Extract images
-            try:
-                image_list = page.get_images(full=True)
-            except Exception as e:
-                print(f"Warning: Could not get images from page {page_num + 1}. Error: {e}")
-                image_list = []
-
-            for img_index, img in enumerate(image_list):
-                print(f"Extracting image {img_index + 1} from page {page_num + 1}")
-                xref = img[0]
-                try:
-                    base_image = doc.extract_image(xref)
-                    if not base_image: # Check if extraction was successful
-                         print(f"Warning: Failed to extract image data for xref {xref} on page {page_num + 1}")
-                         continue
-                    image_bytes = base_image["image"]
-                    image_ext = base_image["ext"]
-                    image_name = f"page_{page_num + 1}_img_{img_index + 1}.{image_ext}" # Page num 1-based
-                    image_path = os.path.join(self.output_dir, image_name)
-
-                    with open(image_path, "wb") as img_file:
-                        img_file.write(image_bytes)
-
-                    image_metadata.append({
-                        "image_path": image_path,
-                        "image_name": image_name,
-                        "page_number": str(page_num + 1) # Store 1-based page number
-                    })
-                except Exception as e:
-                     print(f"Warning: Error processing image xref {xref} on page {page_num + 1}. Error: {e}")
-
-
-        doc.close()
+        text_parts = []
+        image_metadata = []
+        for page_num, (page_text, page_images, blocks) in enumerate(pages):
+            text_parts.append(page_text)
+            image_metadata.extend(page_images)
+            if blocks is not None:
+                self._page_blocks_cache[page_num] = blocks
+
+        if owns_doc:
+            doc.close()
         print(f"Finished extracting text and images from PDF.")
-        return full_text, image_metadata
+        return "".join(text_parts), image_metadata
+
+    def _extract_pages(self, doc: fitz.Document, blocks_limit: int) -> List[Tuple[str, List[Dict[str, str]], Optional[List[Dict[str, Any]]]]]:
+        """Extract every page from the shared document; image files are written by a thread pool meanwhile."""
+        pages = []
+        with ThreadPoolExecutor(max_workers=IMAGE_WRITE_WORKERS) as writer:
+            pending = []
+            for page_num in range(len(doc)):
+                page_text, images, blocks = _extract_page(doc, page_num, self.output_dir, page_num < blocks_limit)
+                # Decoding stays on this thread (fitz documents are not thread-safe); the file write is handed off
+                pending.append((page_text, [(writer.submit(_write_image, metadata["image_path"], image_bytes), metadata)
+                                            for metadata, image_bytes in images], blocks))
+
+            # Keep metadata in page order and only for images that were actually written
+            for page_text, writes, blocks in pending:
+                written = []
+                for future, metadata in writes:
+                    try:
+                        future.result()
+                        written.append(metadata)
+                    except Exception as e:
+                        print(f"Warning: Error writing image {metadata['image_name']}. Error: {e}")
+                pages.append((page_text, written, blocks))
+        return pages
+
+    def _page_blocks(self, doc: fitz.Document, page_num: int) -> List[Dict[str, Any]]:
+        """Text blocks of a page, parsed once per build and shared by the title and subtopic passes."""
+        blocks = self._page_blocks_cache.get(page_num)
+        if blocks is None:
+            blocks = doc[page_num].get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]# type: ignore[attr-defined]
+            self._page_blocks_cache[page_num] = blocks
+        return blocks
+
+    def _document_digest(self) -> str:
+        """Content hash of the PDF file, read in chunks."""
+        digest = hashlib.blake2b(digest_size=16)
+        with open(self.pdf_path, "rb") as pdf_file:
+            for chunk in iter(lambda: pdf_file.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
 
     def generate_text_with_groq(self, prompt: str, model: str = "llama-3.3-70b-versatile") -> str:
         """Generate text using Groq API with the given prompt."""
@@ -110,8 +221,8 @@ class PDFKnowledgeGraph:
             # raise ValueError("GROQ_API environment variable not set.")
             return "[Groq API key missing]" # Return an indicator string
 
-        # Use the actual Groq client or the dummy one if Groq isn't installed
-        client = Groq(api_key=api_key)
+        # Created on first use and shared across instances
+        client = _groq_client(api_key)
 
         try:
             chat_completion = client.chat.completions.create(
@@ -167,21 +278,53 @@ class PDFKnowledgeGraph:
             return "Unnamed Subtopic (Empty Input)"
 
         # Use specific BAML function
-        name = self.baml.generate_subtopic_name(subtopic_text=text_sample)
-        
+        return self._clean_subtopic_name(self.baml.generate_subtopic_name(subtopic_text=text_sample))
+
+    async def generate_subtopic_name_async(self, subtopic_text: str) -> str:
+        """Async variant of generate_subtopic_name_with_groq, for concurrent naming of many subtopics."""
+        text_sample = subtopic_text[:500].strip()
+        if not text_sample:
+            print("Warning: Subtopic text sample is empty.")
+            return "Unnamed Subtopic (Empty Input)"
+        return self._clean_subtopic_name(await self.baml.generate_subtopic_name_async(subtopic_text=text_sample))
+
+    @staticmethod
+    def _clean_subtopic_name(name: str) -> str:
         # Basic cleaning of the name
         name = name.strip('."').replace("Subtopic Name: ", "").replace("subtopic name: ", "")
         print(f"BAML generated subtopic name: {name}")
         return name if name else "Unnamed Subtopic (Generation Failed)"
 
+    async def name_subtopics(self, subtopics: List[Dict[str, Any]]) -> None:
+        """Replace the names of subtopics flagged with needs_name, generating them concurrently."""
+        pending = [subtopic for subtopic in subtopics if subtopic.pop("needs_name", False)]
+        if not pending:
+            return
+        print(f"Generating names for {len(pending)} subtopics...")
+        semaphore = asyncio.Semaphore(LLM_CONCURRENCY) # Limit concurrency
+
+        async def name_with_semaphore(subtopic):
+            async with semaphore:
+                return await self.generate_subtopic_name_async(subtopic["text"])
+
+        results = await asyncio.gather(*(name_with_semaphore(subtopic) for subtopic in pending), return_exceptions=True)
+        for subtopic, result in zip(pending, results):
+            if isinstance(result, Exception):
+                print(f"Error generating name for subtopic '{subtopic['name']}': {result}")
+            else:
+                subtopic["name"] = result
+
     def extract_topic(self, doc: fitz.Document) -> str:
         """Extract the main topic by selecting chunks with larger fonts and using Groq."""
         print("Extracting main topic with PyMuPDF and Groq.")
+        return self._title_from_chunks(self._collect_title_chunks(doc))
+
+    def _collect_title_chunks(self, doc: fitz.Document) -> List[str]:
+        """Collect large or bold text spans from the first pages as title candidates."""
         chunks = []
         try:
             for page_num in range(min(3, len(doc))):  # Limit to first 3 pages
-                page = doc[page_num]
-                blocks = page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"] # type: ignore[attr-defined]
+                blocks = self._page_blocks(doc, page_num)
                 for block in blocks:
                     if block.get("type") == 0: # Text block
                         for line in block.get("lines", []):
@@ -226,8 +369,10 @@ class PDFKnowledgeGraph:
                  except Exception as fallback_e:
                       print(f"Error during fallback text extraction: {fallback_e}")
                       chunks = ["Document Content"] # Absolute fallback
+        return chunks
 
-        # Step 2: Call Groq to generate the topic
+    def _title_from_chunks(self, chunks: List[str]) -> str:
+        """Generate the main topic name from the collected title chunks."""
         try:
             topic = self.generate_title_with_groq(chunks)
         except Exception as e:
@@ -241,26 +386,27 @@ class PDFKnowledgeGraph:
         """Extract subtopics using PyMuPDF for structure, spaCy for validation, and embeddings for clustering."""
         print("Extracting subtopics from PDF.")
         headings = []
-        current_text = ""
+        current_parts: List[str] = [] # Lines of the current subtopic, joined once when it is saved
         current_heading = None
         last_page_processed = -1
 
         # Limit pages processed if needed (e.g., for very large docs or testing)
         # max_pages_for_subtopics = len(doc) # Process all pages by default
-        max_pages_for_subtopics = min(50, len(doc)) # Or limit for testing
+        max_pages_for_subtopics = min(SUBTOPIC_MAX_PAGES, len(doc)) # Or limit for testing
         print(f"Analyzing structure up to page {max_pages_for_subtopics} for subtopics...")
 
         # --- Structural Extraction (PyMuPDF + Heuristics) ---
         try:
-            for page_num in range(max_pages_for_subtopics):
+            page_blocks = [self._page_blocks(doc, page_num) for page_num in range(max_pages_for_subtopics)]
+            heading_like_spans = self._heading_like_spans(page_blocks)
+
+            for page_num, blocks in enumerate(page_blocks):
                 last_page_processed = page_num
-                page = doc[page_num]
-                blocks = page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]# type: ignore[attr-defined]
                 page_content_added = False # Track if content from this page was added
 
                 for block in blocks:
                     if block.get("type") == 0: # Text block
-                        block_text = ""
+                        block_spans = []
                         potential_heading = None
                         max_font_size = 0
                         is_block_bold = False
@@ -272,40 +418,34 @@ class PDFKnowledgeGraph:
                                 if not span_text: continue
 
                                 font_size = span.get("size", 10)
-                                font_flags = span.get("flags", 0)
-                                is_bold = font_flags & (1 << 1)
-                                is_larger = font_size > 12.5 # Slightly increased threshold
-                                is_short = 3 < len(span_text) < 100 # Sensible length for headings
-
-                                # Heuristic for potential headings
-                                if is_short and (is_larger or is_bold) and not span_text.isdigit():
-                                     # Use spaCy for basic validation (check for nouns/proper nouns)
-                                     doc_span = nlp(span_text)
-                                     is_heading_like = any(token.pos_ in ["NOUN", "PROPN", "VERB"] for token in doc_span) and not span_text.isupper()
-
-                                     if is_heading_like:
+                                is_bold = span.get("flags", 0) & (1 << 1)
+
+                                # Heuristic for potential headings, validated by spaCy in _heading_like_spans
+                                if self._is_heading_candidate(span_text, span):
+                                     if heading_like_spans[span_text]:
                                          # Keep the most prominent potential heading in the block
                                          if font_size > max_font_size or (font_size == max_font_size and is_bold and not is_block_bold):
                                               potential_heading = span_text
                                               max_font_size = font_size
                                               is_block_bold = is_bold
                                 # Collect all text in the block
-                                block_text += span_text + " "
+                                block_spans.append(span_text)
 
-                        block_text = block_text.strip()
+                        block_text = " ".join(block_spans)
 
                         # Process the identified potential heading
                         if potential_heading:
                             # If we have a current subtopic, save it before starting the new one
-                            if current_heading and current_text.strip():
+                            current_text = "\n".join(current_parts).strip() if current_heading else ""
+                            if current_text:
                                 print(f"  Found heading: '{potential_heading}' on page {page_num + 1}")
                                 headings.append({
                                     "name": current_heading["name"],
-                                    "text": current_text.strip(),
+                                    "text": current_text,
                                     "start_page": current_heading["start_page"],
                                     "end_page": page_num # End page is the page *before* the new heading
                                 })
-                                current_text = "" # Reset text for the new subtopic
+                                current_parts = [] # Reset text for the new subtopic
 
                             # Start the new subtopic
                             current_heading = {
@@ -313,11 +453,11 @@ class PDFKnowledgeGraph:
                                 "start_page": page_num + 1 # Use 1-based indexing
                             }
                             # Add the heading text itself to the start of the new subtopic text
-                            current_text = potential_heading + "\n" + block_text[len(potential_heading):].strip() + "\n"
+                            current_parts = [potential_heading, block_text[len(potential_heading):].strip()]
                             page_content_added = True
                         elif block_text:
                              # If it's not a heading block, append its text to the current subtopic
-                             current_text += block_text + "\n"
+                             current_parts.append(block_text)
                              page_content_added = True
 
                 # Update end page if content was added and we have an active heading
@@ -325,13 +465,14 @@ class PDFKnowledgeGraph:
                      current_heading["end_page"] = page_num + 1 # Current page is now the end page
 
             # Finalize the last subtopic after the loop
-            if current_heading and current_text.strip():
+            current_text = "\n".join(current_parts).strip()
+            if current_heading and current_text:
                 # If end_page wasn't updated on the very last loop iteration, set it
                 if "end_page" not in current_heading:
                      current_heading["end_page"] = last_page_processed + 1
                 headings.append({
                     "name": current_heading["name"],
-                    "text": current_text.strip(),
+                    "text": current_text,
                     "start_page": current_heading["start_page"],
                     "end_page": current_heading["end_page"]
                 })
@@ -366,7 +507,6 @@ class PDFKnowledgeGraph:
         # --- Refinement and Filtering ---
         subtopics = []
         processed_text_segments = set() # To avoid adding highly overlapping content
-
         for i, heading_data in enumerate(headings):
             subtopic_text = heading_data["text"]
             original_name = heading_data["name"]
@@ -394,9 +534,10 @@ class PDFKnowledgeGraph:
                 len(original_name.split()) > 10 or
                 original_name.isupper()): # Also regenerate if all caps
                 print(f"Regenerating name for subtopic: '{original_name}'")
-                refined_name = self.generate_subtopic_name_with_groq(subtopic_text)
+                needs_name = True # Named concurrently later by name_subtopics
             else:
-                refined_name = original_name # Keep the structurally found name
+                needs_name = False # Keep the structurally found name
+            refined_name = original_name
 
             # Check relevance (can be costly, maybe optional or only for uncertain cases)
             # relevance_score = self.check_subtopic_relevance(subtopic_text)
@@ -409,7 +550,8 @@ class PDFKnowledgeGraph:
                 "text": subtopic_text,
                 "start_page": start_page,
                 "end_page": end_page,
-                "is_relevant": True # Assume relevant if it passed checks
+                "is_relevant": True, # Assume relevant if it passed checks
+                "needs_name": needs_name
             })
             print(f"  Added subtopic: '{refined_name}' (Pages {start_page}-{end_page})")
 
@@ -417,19 +559,50 @@ class PDFKnowledgeGraph:
         # Step 4: Fallback if NO subtopics are found after all processing
         if not subtopics and text:
             print("No subtopics identified after filtering. Creating a single subtopic for the entire document.")
-            name = self.generate_subtopic_name_with_groq(text[:1000])
             subtopics = [{
-                "name": name,
+                "name": "Full Document Content",
                 "text": text,
                 "start_page": 1, # 1-based
                 "end_page": len(doc),
-                "is_relevant": True
+                "is_relevant": True,
+                "needs_name": True
             }]
 
         print(f"Extracted {len(subtopics)} final subtopics.")
         return subtopics
 
 
+    @staticmethod
+    def _is_heading_candidate(span_text: str, span: Dict[str, Any]) -> bool:
+        """Font and length heuristic for spans that might be headings."""
+        is_bold = span.get("flags", 0) & (1 << 1)
+        is_larger = span.get("size", 10) > 12.5 # Slightly increased threshold
+        is_short = 3 < len(span_text) < 100 # Sensible length for headings
+        return bool(is_short and (is_larger or is_bold) and not span_text.isdigit())
+
+    def _heading_like_spans(self, page_blocks: List[List[Dict[str, Any]]]) -> Dict[str, bool]:
+        """Map each distinct heading candidate to whether spaCy sees a noun, proper noun or verb in it.
+
+        All candidates go through one nlp.pipe call instead of one nlp() call per span, with
+        every component that does not contribute to POS tags disabled.
+        """
+        candidates = {}
+        for blocks in page_blocks:
+            for block in blocks:
+                if block.get("type") != 0:
+                    continue
+                for line in block.get("lines", []):
+                    for span in line.get("spans", []):
+                        span_text = span.get("text", "").strip()
+                        if span_text and self._is_heading_candidate(span_text, span):
+                            candidates[span_text] = None
+        texts = list(candidates)
+        disabled = [name for name in nlp.pipe_names if name not in POS_PIPES]
+        return {
+            span_text: any(token.pos_ in ["NOUN", "PROPN", "VERB"] for token in doc_span) and not span_text.isupper()
+            for span_text, doc_span in zip(texts, nlp.pipe(texts, batch_size=512, disable=disabled))
+        }
+
     def check_subtopic_relevance(self, text: str) -> float:
         """Check if a subtopic is relevant and substantial using BAML instead of Groq API."""
         # Take a sample of text if it's too long
@@ -456,9 +629,9 @@ class PDFKnowledgeGraph:
         if len(text_to_summarize) < 50:  # Not enough text to summarize
             return ["- Too short to summarize."]
 
-        # Use BAML's extract_bullet_points (unchanged from previous version)
+        # Await the async BAML client so concurrent subtopics overlap their LLM round-trips
         try:
-            bullet_points_response = self.baml.extract_bullet_points(text=text_to_summarize)
+            bullet_points_response = await self.baml.extract_bullet_points_async(text=text_to_summarize)
             bullet_points = bullet_points_response.points  # Extract the points array from BulletPoints object
             
             # Ensure bullet points start with "- "
@@ -472,7 +645,7 @@ class PDFKnowledgeGraph:
         """Generate bullet points for multiple subtopics concurrently. (Async helper)"""
         # Note: BATCH_SIZE here controls concurrency of asyncio tasks,
         # not necessarily batching to the Groq API itself (unless the API supports it).
-        BATCH_SIZE = 2  # Number of concurrent Groq calls
+        BATCH_SIZE = LLM_CONCURRENCY  # Number of concurrent BAML calls in flight
         all_bullet_points = []
         semaphore = asyncio.Semaphore(BATCH_SIZE) # Limit concurrency
 
@@ -526,13 +699,23 @@ class PDFKnowledgeGraph:
         return subtopics
 
     # **** MODIFIED: Made async and added max_subtopics parameter ****
-    async def build_knowledge_graph(self, max_subtopics: Optional[int] = None) -> None:
+    async def build_knowledge_graph(self, max_subtopics: Optional[int] = None) -> str:
         """
         Extract topic/subtopics from PDF and build the knowledge graph.
 
         Args:
             max_subtopics: Optional integer to limit the number of subtopics processed.
                            If None, all extracted subtopics are processed.
+
+        Returns:
+            The id of the topic that was written.
+
+        Raises:
+            ValueError: If the PDF yields no content or no subtopics; nothing is stored.
+            Any error raised while extracting or storing, after the transaction is rolled back.
+
+        Earlier versions logged these cases and returned None. Scripts calling this directly
+        must now catch the errors; the /create_graph job runner reports them as a failed job.
         """
         # Create output dir if it doesn't exist (moved here from build_knowledge_graph)
         if not os.path.exists(self.output_dir):
@@ -544,25 +727,40 @@ class PDFKnowledgeGraph:
             raise ValueError(f"Invalid or non-existent PDF path: {self.pdf_path}")
         # Output directory is now created in __post_init__ or extract_text_and_images
 
+        # Open the PDF once: text/image extraction, the title and the subtopic passes all share it
+        doc = fitz.open(self.pdf_path)
+        self._page_blocks_cache.clear()
+
         # Extract text and images
-        full_text, image_metadata = self.extract_text_and_images()
+        try:
+            full_text, image_metadata = self.extract_text_and_images(doc)
+        except Exception:
+            doc.close()
+            raise
         if not full_text and not image_metadata:
-             print("Warning: PDF extraction yielded no text or images. Stopping graph build.")
-             return # Stop if PDF seems empty or unreadable
+             doc.close()
+             raise ValueError(f"PDF extraction yielded no text or images for {self.pdf_path}.") # PDF seems empty or unreadable
 
-        doc = None
         try:
-            doc = fitz.open(self.pdf_path)
-
-            # Extract main topic
-            topic_name = self.extract_topic(doc)
-            topic_id = str(uuid.uuid4())
+            # Extract main topic: only the title chunks need the document, so the title LLM call
+            # runs in a worker thread while the subtopic structure is parsed from the pages.
+            # PyMuPDF documents are not thread-safe, so the chunks are collected first.
+            print("Extracting main topic with PyMuPDF and Groq.")
+            title_chunks = await asyncio.to_thread(self._collect_title_chunks, doc)
+
+            # Extract subtopics alongside the title call; both are awaited even if one fails,
+            # so no worker is still running when the document is closed below
+            topic_name, subtopics_data = await asyncio.gather(
+                asyncio.to_thread(self._title_from_chunks, title_chunks),
+                asyncio.to_thread(self.extract_subtopics, doc, full_text),
+                return_exceptions=True,
+            )
+            for result in (topic_name, subtopics_data):
+                if isinstance(result, BaseException):
+                    raise result
+            topic_id = _stable_id(self._document_digest())
             print(f"Creating main topic node with ID: {topic_id} and name: {topic_name}")
             main_topic = Topic(id=topic_id, name=topic_name)
-            self.db_manager.create_topic(main_topic) # Assuming this is synchronous
-
-            # Extract subtopics
-            subtopics_data = self.extract_subtopics(doc, full_text)
 
             # --- Apply Subtopic Limit ---
             if max_subtopics is not None:
@@ -575,51 +773,47 @@ class PDFKnowledgeGraph:
             # --------------------------
 
             if not subtopics_data:
-                 print("No subtopics found or remaining after filtering. Knowledge graph build stopped after creating main topic.")
-                 return
+                 raise ValueError(f"No subtopics found in {self.pdf_path}; nothing was stored.")
+
+            # Generate names where the heading was unusable (only for the subtopics that are kept)
+            await self.name_subtopics(subtopics_data)
 
             # Generate bullet points for the (potentially limited) subtopics
             # **** MODIFIED: await the async call ****
             subtopics_with_bullets = await self.generate_bullet_points(subtopics_data)
 
+            # Index extracted images by page once so each subtopic only visits its own page range
+            # The URL is /images/<pdf_specific_folder_name>/<image_name>
+            pdf_specific_folder_name = os.path.basename(self.output_dir)
+            images_by_page: Dict[int, List[Dict[str, str]]] = {}
+            for img in image_metadata:
+                try:
+                    img_page_num = int(img["page_number"])
+                except ValueError:
+                    print(f"Warning: Could not parse page number '{img.get('page_number')}' for image {img.get('image_name')}")
+                    continue
+                images_by_page.setdefault(img_page_num, []).append({
+                    "image_path": img["image_path"], # Local server path
+                    "image_name": img["image_name"],
+                    "page_number": img["page_number"],
+                    "url": f"/images/{pdf_specific_folder_name}/{img['image_name']}"
+                })
+            first_image_page = min(images_by_page, default=1)
+            last_image_page = max(images_by_page, default=0)
+
             print(f"Adding {len(subtopics_with_bullets)} subtopics to the knowledge graph...")
+            subtopics_to_store = []
             for position, subtopic_data in enumerate(subtopics_with_bullets):
-                subtopic_id = str(uuid.uuid4())
+                subtopic_id = _stable_id(topic_id, str(position), subtopic_data.get("text", ""))
                 subtopic_name = subtopic_data.get("name", f"Unnamed Subtopic {position + 1}")
                 print(f"  Processing subtopic {position + 1}/{len(subtopics_with_bullets)}: '{subtopic_name[:50]}...' (ID: {subtopic_id})")
 
-                # Assign images to subtopics based on page range
+                # Assign images to subtopics based on page range, reading the per-page index
                 start_page = subtopic_data.get("start_page", 0)
-                end_page = subtopic_data.get("end_page", float('inf'))
+                end_page = subtopic_data.get("end_page", last_image_page)
                 subtopic_images = []
-                for img in image_metadata:
-                    try:
-                        img_page_num = int(img["page_number"]) # Ensure comparison is int vs int
-                        # Check if image page number falls within the subtopic's page range
-                        if start_page <= img_page_num <= end_page:
-                            # --- CORRECTED URL CALCULATION ---
-
-                            # Assume self.output_dir is like "./extracted_images/PdfSpecificFolder"
-                            # The pdf_specific_folder_name is the part needed after /images/
-                            pdf_specific_folder_name = os.path.basename(self.output_dir)
-
-                            # The final URL should be /images/<pdf_specific_folder_name>/<image_name>
-                            image_url = f"/images/{pdf_specific_folder_name}/{img['image_name']}"
-
-                            # --- END CORRECTION ---
-
-                            subtopic_images.append({
-                                "image_path": img["image_path"], # Local server path
-                                "image_name": img["image_name"],
-                                "page_number": img["page_number"],
-                                # Use the correctly constructed URL
-                                "url": image_url
-                            })
-                    except ValueError:
-                        print(f"Warning: Could not parse page number '{img.get('page_number')}' for image {img.get('image_name')}")
-                    except Exception as e:
-                         print(f"Warning: Error processing image metadata for subtopic: {e}")
-
+                for page in range(max(start_page, first_image_page), min(end_page, last_image_page) + 1):
+                    subtopic_images.extend(images_by_page.get(page, ()))
 
                 subtopic = Subtopic(
                     id=subtopic_id,
@@ -629,23 +823,35 @@ class PDFKnowledgeGraph:
                     bullet_points=subtopic_data.get("bullet_points", []),
                     image_metadata=subtopic_images
                 )
-                # Assuming db_manager calls are synchronous
-                self.db_manager.create_and_link_subtopic(topic_id, subtopic, position)
+                subtopics_to_store.append(subtopic)
+
+            # Store the topic and all its subtopics in one transaction; list order is the subtopic position.
+            # The IDs are stable, so re-ingesting the same PDF MERGEs onto the same nodes: its old
+            # SUBTOPIC_OF edges are dropped first so a different subtopic list leaves no stale links,
+            # and old subtopics left without any parent are deleted once the new list is linked.
+            # Always MERGE, so concurrent uploads of one PDF cannot collide on a primary key
+            with self.db_manager.batch_writes():
+                stored = self.db_manager.create_topic(main_topic)
+                previous_ids = self.db_manager.unlink_subtopics(topic_id) if stored else None
+                if not (previous_ids is not None
+                        and self.db_manager.create_and_link_subtopics_bulk(topic_id, subtopics_to_store)
+                        and self.db_manager.delete_unlinked_subtopics(previous_ids)):
+                    raise RuntimeError(f"Failed to store topic {topic_id} and its subtopics; transaction rolled back.")
 
         except Exception as e:
              print(f"An error occurred during knowledge graph construction: {e}")
-             # Optionally re-raise the exception if needed by the calling context
-             # raise e
+             raise # Callers (the /create_graph job) report the failure
         finally:
-            if doc:
-                doc.close()
-                print("Closed PDF document.")
+            doc.close()
+            self._page_blocks_cache.clear()
+            print("Closed PDF document.")
 
         print("Knowledge graph construction process finished.")
+        return topic_id
 
     def get_all_topics(self) -> List[Dict[str, Any]]:
         try:
-            response = self.db_manager.conn.execute("MATCH (t:Topic) RETURN t ORDER BY t.name")
+            response = self.db_manager.execute("MATCH (t:Topic) RETURN t ORDER BY t.name")
             topics = []
             while response.has_next():# type: ignore[attr-defined]
                 topic_data = response.get_next()[0]# type: ignore[attr-defined]
@@ -660,25 +866,28 @@ class PDFKnowledgeGraph:
             topic = self.db_manager.get_topic(topic_id)
             if not topic:
                 return None
-            subtopics = self.db_manager.get_subtopics(topic_id)
+            # Read as columns: the JSON rows are built straight from them, without Subtopic objects
+            columns = self.db_manager.get_subtopics_columnar(topic_id)
             return {
                 "id": topic.id,
                 "name": topic.name,
                 "subtopics": [
                     {
-                        "id": subtopic.id,
-                        "name": subtopic.name,
-                        "full_text": subtopic.full_text,
-                        "bullet_points": subtopic.bullet_points,
+                        "id": subtopic_id,
+                        "name": name,
+                        "full_text": full_text,
+                        "bullet_points": bullet_points,
                         "image_metadata": [
                             {
                                 "image_path": img["image_path"],
                                 "image_name": img["image_name"],
                                 "page_number": img["page_number"],
                                 "url": img["url"]
-                            } for img in subtopic.image_metadata
+                            } for img in image_metadata
                         ]
-                    } for subtopic in subtopics
+                    } for subtopic_id, name, full_text, bullet_points, image_metadata in zip(
+                        columns["id"], columns["name"], columns["full_text"],
+                        columns["bullet_points"], columns["image_metadata"])
                 ]
             }
         except Exception as e:
@@ -687,7 +896,7 @@ class PDFKnowledgeGraph:
 
     def get_subtopic_details(self, subtopic_id: str) -> Optional[Dict[str, Any]]:
         try:
-            response = self.db_manager.conn.execute(
+            response = self.db_manager.execute_prepared(
                 "MATCH (s:Subtopic {id: $id}) RETURN s",
                 {"id": subtopic_id}
             )
@@ -698,12 +907,12 @@ class PDFKnowledgeGraph:
                     name=s_data["name"],
                     full_text=s_data["text"],
                     bullet_points=s_data["bullet_points"],
-                    image_metadata=json.loads(s_data["image_metadata"])
+                    image_metadata=s_data["image_metadata"] or []
                 )
             else:
                 return None
             
-            topic_response = self.db_manager.conn.execute(
+            topic_response = self.db_manager.execute_prepared(
                 "MATCH (s:Subtopic {id: $id})-[:SUBTOPIC_OF]->(t:Topic) RETURN t",
                 {"id": subtopic_id}
             )
@@ -77,6 +77,7 @@ def main():
 
     logger.info(f"✅ Download complete. Ingesting {rows_loaded} entries into LanceDB...")
     shared_multimodal_db.add_entries(entries)
+    shared_multimodal_db.refresh_fts_index()  # Make the new rows searchable by the FTS leg of hybrid search
     logger.info("✔ Done.")
 
 if __name__ == "__main__":